@@ -0,0 +1,46 @@
+"""Time compiling a typical prompt template, and rendering it once compiled.
+
+Literals are merged, constants folded and `str()` skipped at compile time, so watch both numbers when changing codegen.
+
+Usage: python benchmarks/compiler.py [number]
+"""
+
+from sys import argv
+from timeit import timeit
+
+from promplate import Template
+from promplate.prompt.cache import code_cache
+
+TEXT = """\
+<|system|>
+You are a helpful assistant. {{ "=" * 20 }}
+{% for example in examples %}
+<|user|>
+{{ example["question"] }}
+<|assistant|>
+{{ example["answer"] }} ({{ loop_hint }}, {{ 'done'.upper() }})
+{% endfor %}
+<|user|>
+{{ question }}
+"""
+
+CONTEXT = {
+    "examples": [{"question": f"question {i}", "answer": f"answer {i}"} for i in range(20)],
+    "loop_hint": "example",
+    "question": "What is promplate?",
+}
+
+
+def main(number: int):
+    def compile():
+        code_cache.clear()
+        return Template(TEXT)._render_code
+
+    t = Template(TEXT)
+
+    print(f"compile {timeit(compile, number=number) / number * 1e6:8.1f} us", end=" | ")
+    print(f"render {timeit(lambda: t.render(CONTEXT), number=number) / number * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main(int(argv[1]) if len(argv) > 1 else 2000)
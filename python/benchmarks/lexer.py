@@ -0,0 +1,63 @@
+"""Compare the single-pass lexer with the regex tokenizer it replaced, on a large few-shot template.
+
+Usage: python benchmarks/lexer.py [number]
+"""
+
+from sys import argv
+from timeit import timeit
+
+from promplate.prompt.lexer import Lexer, tokenize
+from promplate.prompt.utils import split_template_tokens
+
+EXAMPLE = """\
+<|user|>
+Summarize the following article in {{ style }} style:
+{"title": "Example {{ i }}", "body": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4}
+<|assistant|>
+{%- if verbose %}
+A detailed summary of example number {{ i }}, with some {braces} and percentages like 100% right.
+{%- else %}
+Short summary.
+{%- endif %}
+{# count = count + 1 #}
+"""
+
+TEXT = EXAMPLE * 400  # about 160 KB
+
+
+def regex(text: str):
+    result = []
+    for token in split_template_tokens(text):
+        if not token:
+            continue
+        s_token = token.strip()
+        if s_token.startswith("{{") and s_token.endswith("}}"):
+            result.append(("eval", token))
+        elif s_token.startswith("{#") and s_token.endswith("#}"):
+            result.append(("exec", token))
+        elif s_token.startswith("{%") and s_token.endswith("%}") and "\n" not in s_token:
+            result.append(("special", token))
+        else:
+            result.append(("literal", token))
+    return result
+
+
+def main(number: int):
+    print(f"template: {len(TEXT) / 1024:.0f} KB, {len(tokenize(TEXT))} tokens")
+    print(f"   regex: {timeit(lambda: regex(TEXT), number=number) / number * 1e3:8.2f} ms")
+    print(f"   lexer: {timeit(lambda: tokenize(TEXT), number=number) / number * 1e3:8.2f} ms")
+
+    lexer = Lexer(TEXT)
+    middle = len(TEXT) // 2
+
+    def edit():
+        lexer.edit(middle, middle, "{{ x }}")
+        lexer.edit(middle, middle + 7, "")
+
+    print(
+        f"    edit: {timeit(edit, number=number) / number / 2 * 1e3:8.2f} ms (re-lexing {lexer.edit(middle, middle, ' ')} tokens)"
+    )
+
+
+if __name__ == "__main__":
+    main(int(argv[1]) if len(argv) > 1 else 50)
@@ -1,2 +1,4 @@
 from .callback import BaseCallback, Callback
-from .node import Chain, ChainContext, Jump, Loop, Node
+from .graph import Graph, GraphReport
+from .node import Chain, ChainContext, Jump, Loop, Node, Outcome, Parallel, StreamEvent
+from .utils import Coalesce
@@ -1,3 +1,4 @@
+from concurrent.futures import Executor
 from typing import TYPE_CHECKING, Awaitable, Callable, Protocol
 
 from ..prompt import Context
@@ -7,6 +8,13 @@ if TYPE_CHECKING:
 
 
 class BaseCallback(Protocol):
+    offload: bool | Executor = False
+    """run the processes in an executor under `ainvoke` / `astream`, so CPU-heavy ones don't block the event loop
+
+    `True` uses the loop's default thread pool. Offloaded processes get a copy of the context instead of the context
+    itself, so with a process pool they and their return values have to be picklable. Async processes stay on the loop.
+    """
+
     def pre_process(self, context: "ChainContext") -> Context | Awaitable[Context | None] | None: ...
 
     def mid_process(self, context: "ChainContext") -> Context | Awaitable[Context | None] | None: ...
@@ -29,12 +37,14 @@ class Callback(BaseCallback):
         end_process: "Process | AsyncProcess | None" = None,
         on_enter: Callable[["Interruptable", Context | None, Context], tuple[Context | None, Context]] | None = None,
         on_leave: Callable[["Interruptable", "ChainContext", Context], tuple["ChainContext", Context]] | None = None,
+        offload: bool | Executor = False,
     ):
         self._pre_process = pre_process
         self._mid_process = mid_process
         self._end_process = end_process
         self._on_enter = on_enter
         self._on_leave = on_leave
+        self.offload = offload
 
     def pre_process(self, context):
         if self._pre_process is not None:
@@ -57,3 +67,8 @@ class Callback(BaseCallback):
         if self._on_leave is not None:
             return self._on_leave(node, context, config)
         return context, config
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["offload"]  # the process runs inside the executor, which is neither picklable nor needed there
+        return state
@@ -0,0 +1,303 @@
+"""Run nodes as a dependency graph instead of a line, so independent steps overlap.
+
+Every step declares the context keys it reads and writes, or has its reads inferred from its templates.
+A step waits only for the earlier steps it conflicts with, so the whole graph takes about as long as its critical path.
+"""
+
+from asyncio import FIRST_COMPLETED, Queue, create_task
+from asyncio import wait as await_first
+from concurrent.futures import FIRST_COMPLETED as FIRST_DONE
+from concurrent.futures import ThreadPoolExecutor, wait
+from queue import SimpleQueue
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple
+
+from ..prompt.template import Context
+from .callback import BaseCallback
+from .node import (
+    AbstractNode,
+    Chain,
+    ChainContext,
+    Interruptable,
+    Jump,
+    Loop,
+    Node,
+    Parallel,
+    StreamEvent,
+    _asteps_of,
+    _steps_of,
+)
+
+
+class Step(NamedTuple):
+    node: AbstractNode
+    reads: frozenset[str]
+    writes: frozenset[str]
+    output: str | None
+    """the key which receives the step's `__result__`"""
+    after: frozenset[int]
+    """indices of the earlier steps this one waits for"""
+
+
+class Timing(NamedTuple):
+    node: AbstractNode
+    start: float
+    end: float
+    """both in seconds since the graph started"""
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class GraphReport(NamedTuple):
+    timings: list[Timing | None]
+    """per step, in the order they were added, `None` for the ones which never ran"""
+    critical_path: list[Timing]
+    """the chain of dependencies which finished last, which bounds how fast the graph can get"""
+    elapsed: float
+
+    @property
+    def busy(self):
+        """total time spent in steps, which is what running them one by one would roughly take"""
+        return sum(timing.duration for timing in self.timings if timing is not None)
+
+
+def infer_reads(node: AbstractNode) -> frozenset[str]:
+    """names the templates of a node read from the context, leaving out the ones its partial context provides"""
+
+    match node:
+        case Node():
+            return node.template.dependencies.reads - (node._context or {}).keys()
+        case Loop():
+            return infer_reads(node.chain) - (node._context or {}).keys()
+        case Chain() | Parallel() | Graph():
+            return frozenset().union(*map(infer_reads, node)) - (node._context or {}).keys()
+    raise TypeError(f"can't infer what {node!r} reads, pass `reads=` when adding it")
+
+
+_done = object()
+
+
+class _Schedule:
+    """bookkeeping of a single run, shared by the threaded and the async executors"""
+
+    def __init__(self, graph: "Graph", context: ChainContext):
+        self.graph = graph
+        self.context = context
+        self.pending = list(range(len(graph.steps)))
+        self.done: set[int] = set()
+        self.running = 0
+        self.starts: dict[int, float] = {}
+        self.timings: list[Timing | None] = [None] * len(graph.steps)
+        self.jump: Jump | None = None
+        self.stopped = False
+        """set once nobody consumes the run anymore, like a stream closed early"""
+        self.origin = perf_counter()
+
+    def ready(self):
+        """steps which can start now, each with a fresh layer to write into"""
+
+        if self.jump is not None or self.stopped:
+            return []
+
+        steps = self.graph.steps
+        limit = self.graph.concurrency or len(steps)
+        started = [index for index in self.pending if steps[index].after <= self.done][: max(limit - self.running, 0)]
+
+        for index in started:
+            self.pending.remove(index)
+            self.starts[index] = perf_counter()
+        self.running += len(started)
+
+        return [(index, steps[index].node, ChainContext({}, self.context)) for index in started]
+
+    def finish(self, index: int, branch: ChainContext, error: BaseException | None):
+        self.running -= 1
+        step = self.graph.steps[index]
+        self.timings[index] = Timing(step.node, self.starts[index] - self.origin, perf_counter() - self.origin)
+
+        if error is not None and not isinstance(error, Jump):
+            raise error
+
+        layer = branch.maps[0]
+        self.context.update({key: value for key, value in layer.items() if key != "__result__"})
+        if "__result__" in layer:
+            if step.output is not None:
+                self.context[step.output] = layer["__result__"]
+            if index == len(self.graph.steps) - 1:
+                self.context.result = layer["__result__"]  # the last step added is the graph's result
+
+        self.done.add(index)
+        if error is not None and self.jump is None:
+            self.jump = error  # let the running steps finish, but start no more
+
+    def report(self):
+        steps, timings = self.graph.steps, self.timings
+        path: list[Timing] = []
+
+        candidates = [index for index, timing in enumerate(timings) if timing is not None]
+        while candidates:
+            index = max(candidates, key=lambda index: timings[index].end)  # type: ignore
+            path.append(timings[index])  # type: ignore
+            candidates = [i for i in steps[index].after if timings[i] is not None]
+
+        return GraphReport(timings, path[::-1], perf_counter() - self.origin)
+
+
+class Graph(Interruptable):
+    """Run steps as soon as the steps they depend on are done, at most `concurrency` at a time.
+
+    A step depends on an earlier one when one of them writes a key the other reads or writes, or when listed in `after`.
+    Steps run in their own layer over the shared context, and their writes get published once they finish.
+    Every run leaves its `GraphReport` in the context under `"__graph_report__"`.
+    """
+
+    def __init__(self, partial_context: Context | None = None, concurrency: int | None = None):
+        self.steps: list[Step] = []
+        self._context = partial_context
+        self.callbacks: list[BaseCallback | type[BaseCallback]] = []
+        self.concurrency = concurrency
+
+    def add(
+        self,
+        node: AbstractNode,
+        *,
+        reads: Iterable[str] | None = None,
+        writes: Iterable[str] = (),
+        output: str | None = None,
+        after: Iterable[AbstractNode] = (),
+    ):
+        reads = infer_reads(node) if reads is None else frozenset(reads)
+        writes = frozenset(writes) if output is None else frozenset((*writes, output))
+
+        after = list(after)
+        for dependency in after:
+            if not any(step.node is dependency for step in self.steps):
+                raise ValueError(f"{dependency!r} has to be added before the steps running after it")
+
+        self.steps.append(
+            Step(
+                node,
+                reads,
+                writes,
+                output,
+                frozenset(
+                    index
+                    for index, step in enumerate(self.steps)
+                    if step.writes & (reads | writes) or step.reads & writes or any(step.node is i for i in after)
+                ),
+            )
+        )
+
+        return node
+
+    def __iter__(self):
+        return (step.node for step in self.steps)
+
+    @property
+    def _workers(self):
+        return self.concurrency or len(self.steps) or 1
+
+    def _run(self, schedule: _Schedule, run: Callable[[AbstractNode, ChainContext], Any]):
+        futures = {}
+
+        try:
+            with ThreadPoolExecutor(self._workers) as executor:
+                while True:
+                    for index, node, branch in schedule.ready():
+                        futures[executor.submit(run, node, branch)] = index, branch
+                    if not futures:
+                        break
+                    finished, _ = wait(futures, return_when=FIRST_DONE)
+                    for future in finished:
+                        schedule.finish(*futures.pop(future), future.exception())
+        finally:
+            schedule.context["__graph_report__"] = schedule.report()
+
+        if schedule.jump is not None:
+            raise schedule.jump
+
+    async def _arun(self, schedule: _Schedule, run: Callable[[AbstractNode, ChainContext], Awaitable]):
+        tasks = {}
+
+        try:
+            while True:
+                for index, node, branch in schedule.ready():
+                    tasks[create_task(run(node, branch))] = index, branch
+                if not tasks:
+                    break
+                finished, _ = await await_first(tasks, return_when=FIRST_COMPLETED)
+                for task in finished:
+                    schedule.finish(*tasks.pop(task), task.exception())
+        finally:
+            for task in tasks:
+                task.cancel()
+            schedule.context["__graph_report__"] = schedule.report()
+
+        if schedule.jump is not None:
+            raise schedule.jump
+
+    def _invoke(self, context, /, complete, callbacks, **config):
+        self._apply_pre_processes(context, callbacks)
+        self._run(_Schedule(self, context), lambda node, branch: node.invoke(branch, complete, **config))
+        self._apply_mid_processes(context, callbacks)
+        self._apply_end_processes(context, callbacks)
+
+    async def _ainvoke(self, context, /, complete, callbacks, **config):
+        await self._apply_async_pre_processes(context, callbacks)
+        await self._arun(_Schedule(self, context), lambda node, branch: node.ainvoke(branch, complete, **config))
+        await self._apply_async_mid_processes(context, callbacks)
+        await self._apply_async_end_processes(context, callbacks)
+
+    def _stream(self, context, /, generate, callbacks, **config):
+        self._apply_pre_processes(context, callbacks)
+
+        events: SimpleQueue[StreamEvent | None | object] = SimpleQueue()
+        schedule = _Schedule(self, context)
+
+        def run(node: AbstractNode, branch: ChainContext):
+            for _, event in _steps_of(node, branch, generate, **config):
+                if schedule.stopped:
+                    break
+                events.put(event)
+
+        executor = ThreadPoolExecutor(1)
+        scheduler = executor.submit(self._run, schedule, run)
+        scheduler.add_done_callback(lambda _: events.put(_done))
+        executor.shutdown(wait=False)
+
+        try:
+            while (event := events.get()) is not _done:
+                self._apply_mid_processes(context, callbacks)
+                yield event
+        finally:
+            schedule.stopped = True  # only matters when the consumer stops early, the running steps stop at their next event
+
+        scheduler.result()
+        self._apply_end_processes(context, callbacks)
+
+    async def _astream(self, context, /, generate, callbacks, **config):
+        await self._apply_async_pre_processes(context, callbacks)
+
+        events: Queue[StreamEvent | None | object] = Queue()
+
+        async def run(node: AbstractNode, branch: ChainContext):
+            async for _, event in _asteps_of(node, branch, generate, **config):
+                events.put_nowait(event)
+
+        scheduler = create_task(self._arun(_Schedule(self, context), run))
+        scheduler.add_done_callback(lambda _: events.put_nowait(_done))
+
+        try:
+            while (event := await events.get()) is not _done:
+                await self._apply_async_mid_processes(context, callbacks)
+                yield event
+        finally:
+            scheduler.cancel()  # only matters when the consumer stops early
+
+        await scheduler
+        await self._apply_async_end_processes(context, callbacks)
+
+    def __repr__(self):
+        return f"Graph({', '.join(map(str, self))})"
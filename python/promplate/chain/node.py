@@ -1,15 +1,52 @@
-from inspect import isclass
-from itertools import accumulate
-from typing import Callable, Mapping, MutableMapping, TypeVar, overload
+from asyncio import (
+    FIRST_COMPLETED,
+    Queue,
+    Semaphore,
+    Task,
+    create_task,
+    gather,
+    get_running_loop,
+)
+from asyncio import wait as await_first
+from collections import ChainMap
+from concurrent.futures import FIRST_COMPLETED as FIRST_DONE
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+from functools import partial
+from inspect import isawaitable, isclass, iscoroutinefunction
+from itertools import islice
+from queue import SimpleQueue
+from threading import Event
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterator,
+    Literal,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    TypeVar,
+    overload,
+)
 
 from ..llm.base import *
 from ..prompt.template import Context, Loader, SafeChainMapContext, Template
 from .callback import BaseCallback, Callback
-from .utils import accumulate_any, resolve
+from .utils import Coalesce, StreamingResult, iterate_any, resolve
 
 C = TypeVar("C", bound="ChainContext")
 
 
+def _stored(mapping: Mapping, key: str):
+    """the value as stored, unlike reading it from a `ChainContext`, which turns a result being streamed into a `str`"""
+    if not isinstance(mapping, ChainMap):
+        return mapping.get(key)
+    for inner in mapping.maps:
+        if key in inner:
+            return _stored(inner, key)
+    return None
+
+
 class ChainContext(SafeChainMapContext):
     @overload
     def __new__(cls): ...
@@ -37,6 +74,10 @@ class ChainContext(SafeChainMapContext):
     def ensure(cls, context):
         return context if isinstance(context, cls) else cls(context)
 
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        return str(value) if value.__class__ is StreamingResult else value  # a result being streamed reads as a `str`
+
     @property
     def result(self):
         return self.__getitem__("__result__")
@@ -49,10 +90,35 @@ class ChainContext(SafeChainMapContext):
     def result(self):
         self.__delitem__("__result__")
 
+    @property
+    def delta(self) -> str | None:
+        """the latest chunk while streaming, `None` otherwise"""
+        result = _stored(self, "__result__")
+        return result.delta if isinstance(result, StreamingResult) else None
+
     def __str__(self):
         return str({**self})
 
 
+class StreamEvent(NamedTuple):
+    """one chunk of a `stream(..., mode="delta")`, carrying no copy of the accumulated result"""
+
+    node: "Node"
+    delta: str
+    length: int
+    """length of the node's result so far, including this delta"""
+
+
+class Outcome(NamedTuple):
+    """the result of one item of `invoke_many` / `ainvoke_many`"""
+
+    index: int
+    """position of the item in the input"""
+    context: ChainContext
+    """the returned context, or the partially updated input one if the invocation failed"""
+    error: Exception | None
+
+
 Process = Callable[[ChainContext], Context | None]
 
 AsyncProcess = Callable[[ChainContext], Awaitable[Context | None]]
@@ -75,22 +141,50 @@ class AbstractNode(Protocol):
         **config,
     ) -> ChainContext: ...
 
+    @overload
     def stream(
         self,
         context: Context | None = None,
         /,
         generate: Generate | None = None,
+        *,
+        mode: Literal["context"] = "context",
         **config,
     ) -> Iterable[ChainContext]: ...
 
+    @overload
+    def stream(
+        self,
+        context: Context | None = None,
+        /,
+        generate: Generate | None = None,
+        *,
+        mode: Literal["delta"],
+        **config,
+    ) -> Iterable["StreamEvent"]: ...
+
+    @overload
     def astream(
         self,
         context: Context | None = None,
         /,
         generate: Generate | AsyncGenerate | None = None,
+        *,
+        mode: Literal["context"] = "context",
         **config,
     ) -> AsyncIterable[ChainContext]: ...
 
+    @overload
+    def astream(
+        self,
+        context: Context | None = None,
+        /,
+        generate: Generate | AsyncGenerate | None = None,
+        *,
+        mode: Literal["delta"],
+        **config,
+    ) -> AsyncIterable["StreamEvent"]: ...
+
     @classmethod
     def _get_chain_type(cls):
         return Chain
@@ -101,10 +195,44 @@ class AbstractNode(Protocol):
         return self._get_chain_type()(self, chain)
 
 
+class _OnLoop:
+    """returned by an offloaded process which turned out to be async, as coroutines belong on the event loop"""
+
+
+def _run_offloaded(process: Callable[[ChainContext], Context | None], values: dict):
+    """runs in the executor, returning what the process returned plus what it assigned to its copy of the context"""
+
+    snapshot = ChainContext(values)
+    before = values.copy()
+    updates = process(snapshot)
+    if isawaitable(updates):
+        getattr(updates, "close", lambda: None)()  # never started, so none of its code ran
+        return _OnLoop
+    updates = updates or {}
+    return {key: value for key, value in values.items() if key not in before or before[key] is not value} | dict(updates)
+
+
 def ensure_callbacks(callbacks: list[BaseCallback | type[BaseCallback]]) -> list[BaseCallback]:
     return [i() if isclass(i) else i for i in callbacks]
 
 
+def _steps_of(node: AbstractNode, context: ChainContext, generate, **config):
+    """the steps of a child node, only `Interruptable` ones describe them with events, and take a `mode`"""
+    if (steps := getattr(node, "_steps", None)) is not None:
+        return steps(context, generate, **config)
+    return ((step, None) for step in node.stream(context, generate, **config))
+
+
+async def _asteps_of(node: AbstractNode, context: ChainContext, generate, **config):
+    """the steps of a child node, only `Interruptable` ones describe them with events, and take a `mode`"""
+    if (asteps := getattr(node, "_asteps", None)) is not None:
+        async for step in asteps(context, generate, **config):
+            yield step
+    else:
+        async for step in node.astream(context, generate, **config):
+            yield step, None
+
+
 class Interruptable(AbstractNode, Protocol):
     def _invoke(
         self,
@@ -155,16 +283,16 @@ class Interruptable(AbstractNode, Protocol):
             context, config = callback.on_leave(self, context, config)
         return context, config
 
-    def add_pre_processes(self, *processes: Process | AsyncProcess):
-        self.callbacks.extend(Callback(pre_process=i) for i in processes)
+    def add_pre_processes(self, *processes: Process | AsyncProcess, offload: bool | Executor = False):
+        self.callbacks.extend(Callback(pre_process=i, offload=offload) for i in processes)
         return self
 
-    def add_mid_processes(self, *processes: Process | AsyncProcess):
-        self.callbacks.extend(Callback(mid_process=i) for i in processes)
+    def add_mid_processes(self, *processes: Process | AsyncProcess, offload: bool | Executor = False):
+        self.callbacks.extend(Callback(mid_process=i, offload=offload) for i in processes)
         return self
 
-    def add_end_processes(self, *processes: Process | AsyncProcess):
-        self.callbacks.extend(Callback(end_process=i) for i in processes)
+    def add_end_processes(self, *processes: Process | AsyncProcess, offload: bool | Executor = False):
+        self.callbacks.extend(Callback(end_process=i, offload=offload) for i in processes)
         return self
 
     def add_callbacks(self, *callbacks: BaseCallback | type[BaseCallback]):
@@ -202,20 +330,30 @@ class Interruptable(AbstractNode, Protocol):
         for callback in reversed(callbacks):
             context |= cast(Context, callback.end_process(context) or {})
 
+    @staticmethod
+    async def _run_process(callback: BaseCallback, process: Callable[[ChainContext], Any], context: ChainContext):
+        if not (offload := getattr(callback, "offload", False)) or iscoroutinefunction(process):
+            return await resolve(process(context))
+        executor = None if offload is True else offload
+        result = await get_running_loop().run_in_executor(executor, _run_offloaded, process, dict(context))
+        if result is _OnLoop:  # like a `Callback` wrapping an async process
+            return await resolve(process(context))
+        return result
+
     @staticmethod
     async def _apply_async_pre_processes(context: ChainContext, callbacks: list[BaseCallback]):
         for callback in callbacks:
-            context |= cast(Context, await resolve(callback.pre_process(context)) or {})
+            context |= cast(Context, await Interruptable._run_process(callback, callback.pre_process, context) or {})
 
     @staticmethod
     async def _apply_async_mid_processes(context: ChainContext, callbacks: list[BaseCallback]):
         for callback in callbacks:
-            context |= cast(Context, await resolve(callback.mid_process(context)) or {})
+            context |= cast(Context, await Interruptable._run_process(callback, callback.mid_process, context) or {})
 
     @staticmethod
     async def _apply_async_end_processes(context: ChainContext, callbacks: list[BaseCallback]):
         for callback in reversed(callbacks):
-            context |= cast(Context, await resolve(callback.end_process(context)) or {})
+            context |= cast(Context, await Interruptable._run_process(callback, callback.end_process, context) or {})
 
     def invoke(self, context=None, /, complete=None, **config) -> ChainContext:
         context, config, callbacks = self.enter(context, config)
@@ -251,39 +389,162 @@ class Interruptable(AbstractNode, Protocol):
 
         return context
 
-    def stream(self, context=None, /, generate=None, **config) -> Iterable[ChainContext]:
+    def stream(self, context=None, /, generate=None, *, mode: Literal["context", "delta"] = "context", **config):  # type: ignore
+        """yield the context after every chunk, or only a `StreamEvent` describing the chunk with `mode="delta"`"""
+
+        for step, event in self._steps(context, generate, **config):
+            if mode != "delta":
+                yield step
+            elif event is not None:
+                yield event
+
+    async def astream(self, context=None, /, generate=None, *, mode: Literal["context", "delta"] = "context", **config):  # type: ignore
+        """yield the context after every chunk, or only a `StreamEvent` describing the chunk with `mode="delta"`"""
+
+        async for step, event in self._asteps(context, generate, **config):
+            if mode != "delta":
+                yield step
+            elif event is not None:
+                yield event
+
+    def _steps(self, context=None, generate=None, **config) -> Iterator[tuple[ChainContext, "StreamEvent | None"]]:
+        """every step of `stream`, with the event describing it, or `None` like when a custom `_stream` signals progress"""
+
         context, config, callbacks = self.enter(context, config)
         context = ChainContext.ensure(context)
 
         try:
-            for _ in self._stream(ChainContext(context, self.context), generate, callbacks, **config):
-                yield context
+            for event in self._stream(ChainContext(context, self.context), generate, callbacks, **config):
+                yield context, event
         except Jump as jump:
             context, config = self.leave(context, config, callbacks)
             if jump.out_of is not None and jump.out_of is not self:
                 raise jump from None
             if jump.into is not None:
-                yield from jump.into.stream(context, generate, **config)
+                yield from _steps_of(jump.into, context, generate, **config)
         else:
             context, config = self.leave(context, config, callbacks)
 
-    async def astream(self, context=None, /, generate=None, **config) -> AsyncIterable[ChainContext]:
+    async def _asteps(self, context=None, generate=None, **config) -> AsyncIterator[tuple[ChainContext, "StreamEvent | None"]]:
+        """every step of `astream`, with the event describing it, or `None` like when a custom `_astream` signals progress"""
+
         context, config, callbacks = self.enter(context, config)
         context = ChainContext.ensure(context)
 
         try:
-            async for _ in self._astream(ChainContext(context, self.context), generate, callbacks, **config):
-                yield context
+            async for event in self._astream(ChainContext(context, self.context), generate, callbacks, **config):
+                yield context, event
         except Jump as jump:
             context, config = self.leave(context, config, callbacks)
             if jump.out_of is not None and jump.out_of is not self:
                 raise jump from None
             if jump.into is not None:
-                async for i in jump.into.astream(context, generate, **config):
-                    yield i
+                async for step in _asteps_of(jump.into, context, generate, **config):
+                    yield step
         else:
             context, config = self.leave(context, config, callbacks)
 
+    def invoke_many(
+        self,
+        contexts: Iterable[Context | None],
+        /,
+        complete: Complete | None = None,
+        *,
+        concurrency=8,
+        ordered=True,
+        executor: Executor | None = None,
+        **config,
+    ) -> Iterator[Outcome]:
+        """invoke once per context on a thread pool, yielding an `Outcome` per item in input order, or as they complete
+
+        At most `concurrency` items are in flight and inputs are consumed lazily, so the batch can be arbitrarily long.
+        Failures are reported in their outcomes instead of aborting the batch.
+        """
+
+        pool = ThreadPoolExecutor(concurrency) if executor is None else executor
+        invoke = partial(self.invoke, complete=complete, **config)
+
+        inputs = enumerate(contexts)
+        running: dict[Future[ChainContext], tuple[int, ChainContext]] = {}
+        finished: dict[int, Outcome] = {}
+        next_index = 0
+
+        try:
+            while True:
+                for index, context in islice(inputs, concurrency - len(running)):
+                    context = ChainContext.ensure(context)
+                    running[pool.submit(invoke, context)] = index, context
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_DONE)
+                for future in done:
+                    index, context = running.pop(future)
+                    error = cast(Exception | None, future.exception())
+                    finished[index] = Outcome(index, context if error else future.result(), error)
+
+                if not ordered:
+                    yield from finished.values()
+                    finished.clear()
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+        finally:
+            if executor is None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    async def ainvoke_many(
+        self,
+        contexts: Iterable[Context | None] | AsyncIterable[Context | None],
+        /,
+        complete: Complete | AsyncComplete | None = None,
+        *,
+        concurrency=8,
+        ordered=True,
+        **config,
+    ) -> AsyncIterator[Outcome]:
+        """invoke once per context concurrently, yielding an `Outcome` per item in input order, or as they complete
+
+        At most `concurrency` items are in flight and inputs are consumed lazily, so the batch can be arbitrarily long.
+        Failures are reported in their outcomes instead of aborting the batch.
+        """
+
+        inputs = aiter(iterate_any(contexts))
+        exhausted = False
+        running: dict[Task[ChainContext], tuple[int, ChainContext]] = {}
+        finished: dict[int, Outcome] = {}
+        index = next_index = 0
+
+        try:
+            while True:
+                while not exhausted and len(running) < concurrency:
+                    try:
+                        context = ChainContext.ensure(await anext(inputs))
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    running[create_task(self.ainvoke(context, complete, **config))] = index, context
+                    index += 1
+                if not running:
+                    break
+
+                done, _ = await await_first(running, return_when=FIRST_COMPLETED)
+                for task in done:
+                    item, context = running.pop(task)
+                    error = cast(Exception | None, task.exception())
+                    finished[item] = Outcome(item, context if error else task.result(), error)
+
+                if not ordered:
+                    for outcome in finished.values():
+                        yield outcome
+                    finished.clear()
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+        finally:
+            for task in running:
+                task.cancel()  # only left when the consumer stops early
+
     _context: Context | None
 
     @property
@@ -315,6 +576,9 @@ class Node(Loader, Interruptable):
         self.llm = llm
         self.run_config = config
 
+    coalesce: Coalesce | None = None
+    """batch streamed chunks before running mid processes and yielding, `None` handles every chunk"""
+
     def _invoke(self, context, /, complete, callbacks, **config):
         complete = cast(Complete, self.llm.complete if self.llm else complete)
         assert complete is not None
@@ -333,11 +597,19 @@ class Node(Loader, Interruptable):
 
         prompt = self.render(context, callbacks)
 
-        for result in accumulate(generate(prompt, **(self.run_config | config))):
-            context.result = result
+        deltas = generate(prompt, **(self.run_config | config))
+        if self.coalesce is not None:
+            deltas = self.coalesce.batch(deltas)
+
+        result = StreamingResult()
+        for delta in deltas:
+            result.append(delta)
+            context.result = result  # reset every time, in case a mid process replaced it
             self._apply_mid_processes(context, callbacks)
-            yield
+            yield StreamEvent(self, delta, len(result))
 
+        if _stored(context, "__result__") is result:  # unless the last mid process replaced it
+            context.result = str(result)
         self._apply_end_processes(context, callbacks)
 
     async def _ainvoke(self, context, /, complete, callbacks, **config):
@@ -358,11 +630,19 @@ class Node(Loader, Interruptable):
 
         prompt = await self.arender(context, callbacks)
 
-        async for result in accumulate_any(generate(prompt, **(self.run_config | config))):
-            context.result = result
+        deltas = iterate_any(generate(prompt, **(self.run_config | config)))
+        if self.coalesce is not None:
+            deltas = self.coalesce.abatch(deltas)
+
+        result = StreamingResult()
+        async for delta in deltas:
+            result.append(delta)
+            context.result = result  # reset every time, in case a mid process replaced it
             await self._apply_async_mid_processes(context, callbacks)
-            yield
+            yield StreamEvent(self, delta, len(result))
 
+        if _stored(context, "__result__") is result:  # unless the last mid process replaced it
+            context.result = str(result)
         await self._apply_async_end_processes(context, callbacks)
 
     def render(self, context: Context | None = None, callbacks: list[BaseCallback] | None = None):
@@ -406,17 +686,17 @@ class Loop(Interruptable):
     def _stream(self, context, /, generate, callbacks, **config):
         while True:
             self._apply_pre_processes(context, callbacks)
-            for _ in self.chain.stream(context, generate, **config):
+            for _, event in _steps_of(self.chain, context, generate, **config):
                 self._apply_mid_processes(context, callbacks)
-                yield
+                yield event
             self._apply_end_processes(context, callbacks)
 
     async def _astream(self, context, /, generate, callbacks, **config):
         while True:
             await self._apply_async_pre_processes(context, callbacks)
-            async for _ in self.chain.astream(context, generate, **config):
+            async for _, event in _asteps_of(self.chain, context, generate, **config):
                 await self._apply_async_mid_processes(context, callbacks)
-                yield
+                yield event
             await self._apply_async_end_processes(context, callbacks)
 
 
@@ -454,23 +734,176 @@ class Chain(Interruptable):
     def _stream(self, context, /, generate, callbacks: list[BaseCallback], **config):
         self._apply_pre_processes(context, callbacks)
         for node in self.nodes:
-            for _ in node.stream(context, generate, **config):
+            for _, event in _steps_of(node, context, generate, **config):
                 self._apply_mid_processes(context, callbacks)
-                yield
+                yield event
         self._apply_end_processes(context, callbacks)
 
     async def _astream(self, context, /, generate, callbacks: list[BaseCallback], **config):
         await self._apply_async_pre_processes(context, callbacks)
         for node in self.nodes:
-            async for _ in node.astream(context, generate, **config):
+            async for _, event in _asteps_of(node, context, generate, **config):
                 await self._apply_async_mid_processes(context, callbacks)
-                yield
+                yield event
         await self._apply_async_end_processes(context, callbacks)
 
     def __repr__(self):
         return " + ".join(map(str, self.nodes))
 
 
+Merge = Callable[[ChainContext, list[ChainContext]], None]
+
+_branch_done = object()
+
+
+class Parallel(Interruptable):
+    """Run independent nodes concurrently, each in its own layer over the shared context, then merge their writes."""
+
+    def __init__(
+        self,
+        *nodes: AbstractNode,
+        partial_context: Context | None = None,
+        merge: Merge | None = None,
+        concurrency: int | None = None,
+    ):
+        self.nodes = list(nodes)
+        self._context = partial_context
+        self.callbacks: list[BaseCallback | type[BaseCallback]] = []
+        self.merge = self.merge_in_order if merge is None else merge
+        self.concurrency = concurrency
+
+    @staticmethod
+    def merge_in_order(context: ChainContext, branches: list[ChainContext]):
+        """apply the writes of every branch in node order, so later nodes win conflicts, just like in a `Chain`"""
+        for branch in branches:
+            context.update(branch.maps[0])
+
+    @staticmethod
+    def collect(key="results") -> Merge:
+        """merge in order, and store the result of every branch as a list under `key`"""
+
+        def merge(context: ChainContext, branches: list[ChainContext]):
+            Parallel.merge_in_order(context, branches)
+            context[key] = [branch.maps[0].get("__result__") for branch in branches]
+
+        return merge
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def _branch(self, context: ChainContext):
+        return [ChainContext({}, context) for _ in self.nodes]
+
+    def _join(self, context: ChainContext, branches: list[ChainContext], errors: list[BaseException | None]):
+        for error in errors:
+            if error is not None and not isinstance(error, Jump):
+                raise error
+        self.merge(context, branches)
+        for error in errors:
+            if error is not None:
+                raise error  # a `Jump`, raised once every branch has been merged
+
+    @property
+    def _workers(self):
+        return self.concurrency or len(self.nodes) or 1
+
+    def _invoke(self, context, /, complete, callbacks, **config):
+        self._apply_pre_processes(context, callbacks)
+        branches = self._branch(context)
+        with ThreadPoolExecutor(self._workers) as executor:
+            futures = [executor.submit(node.invoke, branch, complete, **config) for node, branch in zip(self.nodes, branches)]
+        self._join(context, branches, [future.exception() for future in futures])
+        self._apply_mid_processes(context, callbacks)
+        self._apply_end_processes(context, callbacks)
+
+    async def _ainvoke(self, context, /, complete, callbacks, **config):
+        await self._apply_async_pre_processes(context, callbacks)
+        branches = self._branch(context)
+        semaphore = Semaphore(self._workers)
+
+        async def run(node: AbstractNode, branch: ChainContext):
+            async with semaphore:
+                await node.ainvoke(branch, complete, **config)
+
+        outcomes = await gather(*map(run, self.nodes, branches), return_exceptions=True)
+        self._join(context, branches, [outcome if isinstance(outcome, BaseException) else None for outcome in outcomes])
+        await self._apply_async_mid_processes(context, callbacks)
+        await self._apply_async_end_processes(context, callbacks)
+
+    def _stream(self, context, /, generate, callbacks, **config):
+        self._apply_pre_processes(context, callbacks)
+        branches = self._branch(context)
+        errors: list[BaseException | None] = [None] * len(self.nodes)
+        events: SimpleQueue[StreamEvent | None | object] = SimpleQueue()
+
+        stopped = Event()
+
+        def run(index: int, node: AbstractNode, branch: ChainContext):
+            try:
+                for _, event in _steps_of(node, branch, generate, **config):
+                    if stopped.is_set():  # the consumer is gone, and nobody would merge this branch anyway
+                        break
+                    events.put(event)
+            except Exception as e:
+                errors[index] = e
+            finally:
+                events.put(_branch_done)
+
+        executor = ThreadPoolExecutor(self._workers)
+        try:
+            for args in enumerate(zip(self.nodes, branches)):
+                executor.submit(run, args[0], *args[1])
+            remaining = len(self.nodes)
+            while remaining:
+                if (event := events.get()) is _branch_done:
+                    remaining -= 1
+                    continue
+                self._apply_mid_processes(context, callbacks)
+                yield event
+        finally:
+            stopped.set()  # only matters when the consumer stops early, otherwise every branch is done
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self._join(context, branches, errors)
+        self._apply_end_processes(context, callbacks)
+
+    async def _astream(self, context, /, generate, callbacks, **config):
+        await self._apply_async_pre_processes(context, callbacks)
+        branches = self._branch(context)
+        errors: list[BaseException | None] = [None] * len(self.nodes)
+        events: Queue[StreamEvent | None | object] = Queue()
+        semaphore = Semaphore(self._workers)
+
+        async def run(index: int, node: AbstractNode, branch: ChainContext):
+            try:
+                async with semaphore:
+                    async for _, event in _asteps_of(node, branch, generate, **config):
+                        events.put_nowait(event)
+            except Exception as e:
+                errors[index] = e
+            finally:
+                events.put_nowait(_branch_done)
+
+        tasks = [create_task(run(index, node, branch)) for index, (node, branch) in enumerate(zip(self.nodes, branches))]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                if (event := await events.get()) is _branch_done:
+                    remaining -= 1
+                    continue
+                await self._apply_async_mid_processes(context, callbacks)
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()  # only matters when the consumer stops early
+
+        self._join(context, branches, errors)
+        await self._apply_async_end_processes(context, callbacks)
+
+    def __repr__(self):
+        return f"Parallel({', '.join(map(str, self.nodes))})"
+
+
 class Jump(Exception):
     def __init__(self, into: Interruptable | None = None, out_of: Interruptable | None = None):
         self.into = into
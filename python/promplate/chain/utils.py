@@ -1,6 +1,16 @@
 from inspect import Parameter, isawaitable, signature
 from itertools import accumulate
-from typing import AsyncIterable, Awaitable, Callable, Iterable, TypeVar, cast
+from time import monotonic
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    TypeVar,
+    cast,
+)
 
 T = TypeVar("T")
 
@@ -29,6 +39,98 @@ async def resolve(maybe_awaitable: T | Awaitable[T], /) -> T:
     return maybe_awaitable  # type: ignore
 
 
+class StreamingResult:
+    """A string growing chunk by chunk, which appends in O(1) and only joins the chunks when it is read."""
+
+    __slots__ = ("_chunks", "_length", "delta")
+
+    def __init__(self):
+        self._chunks: list[str] = []
+        self._length = 0
+        self.delta = ""
+        """the latest chunk"""
+
+    def append(self, delta: str):
+        self._chunks.append(delta)
+        self._length += len(delta)
+        self.delta = delta
+
+    def __str__(self):
+        chunks = self._chunks
+        if len(chunks) > 1:
+            chunks[:] = ["".join(chunks)]  # compact, so reading again before the next chunk costs nothing
+        return chunks[0] if chunks else ""
+
+    def __len__(self):
+        return self._length
+
+    def __eq__(self, other):
+        if isinstance(other, StreamingResult):
+            other = str(other)
+        return str(self) == other if isinstance(other, str) else NotImplemented
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self):
+        return repr(str(self))
+
+
+class Coalesce:
+    """Batch streamed chunks, so that whatever runs per chunk runs at most once every
+    `chunks` chunks, `chars` characters or `interval` seconds, whichever comes first."""
+
+    def __init__(self, chunks: int | None = None, chars: int | None = None, interval: float | None = None):
+        self.chunks = chunks
+        self.chars = chars
+        self.interval = interval
+
+    def _due(self, chunks: int, chars: int, since: float):
+        if self.chunks is self.chars is self.interval is None:
+            return True
+        if self.chunks is not None and chunks >= self.chunks:
+            return True
+        if self.chars is not None and chars >= self.chars:
+            return True
+        return self.interval is not None and monotonic() - since >= self.interval
+
+    def batch(self, deltas: Iterable[str]) -> Iterator[str]:
+        pending: list[str] = []
+        chars, since = 0, monotonic()
+        for delta in deltas:
+            pending.append(delta)
+            chars += len(delta)
+            if self._due(len(pending), chars, since):
+                yield "".join(pending)
+                pending.clear()
+                chars, since = 0, monotonic()
+        if pending:
+            yield "".join(pending)  # always flush the rest at the end
+
+    async def abatch(self, deltas: AsyncIterable[str]) -> AsyncIterator[str]:
+        pending: list[str] = []
+        chars, since = 0, monotonic()
+        async for delta in deltas:
+            pending.append(delta)
+            chars += len(delta)
+            if self._due(len(pending), chars, since):
+                yield "".join(pending)
+                pending.clear()
+                chars, since = 0, monotonic()
+        if pending:
+            yield "".join(pending)  # always flush the rest at the end
+
+
+def iterate_any(any_iterable: Iterable[T] | AsyncIterable[T]) -> AsyncIterable[T]:
+    if "__aiter__" in dir(any_iterable):
+        return any_iterable  # type: ignore
+
+    async def _():
+        for i in cast(Iterable[T], any_iterable):
+            yield i
+
+    return _()
+
+
 async def async_accumulate(async_iterable: AsyncIterable[str]):
     result = ""
     async for delta in async_iterable:
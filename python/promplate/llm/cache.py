@@ -0,0 +1,332 @@
+"""Cache LLM responses, so rerunning byte-identical prompts and configs costs nothing.
+
+Every response is stored as its list of chunks: `complete` stores a single one, `generate` replays them one by one.
+So a streamed response also serves later `complete` calls with the same prompt and config, and the other way around.
+"""
+
+from asyncio import current_task, shield, wrap_future
+from concurrent.futures import Future
+from hashlib import sha256
+from inspect import isasyncgenfunction, iscoroutinefunction
+from json import dumps, loads
+from logging import getLogger
+from os import getpid, replace
+from pathlib import Path
+from threading import Lock, get_ident
+from time import time
+from typing import Any, Protocol
+
+from ..prompt.cache import LRUCache
+from ..prompt.chat import Message
+from .base import *
+
+logger = getLogger(__name__)
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> list[str] | None: ...
+
+    def set(self, key: str, chunks: list[str]) -> None: ...
+
+
+class MemoryBackend:
+    def __init__(self, maxsize: int | None = 1024, ttl: float | None = None):
+        self.data: LRUCache[str, list[str]] = LRUCache(maxsize, ttl)
+
+    def get(self, key: str):
+        try:
+            return self.data.lookup(key)
+        except KeyError:
+            return None
+
+    def set(self, key: str, chunks: list[str]):
+        self.data.set(key, chunks)
+
+
+class FileBackend:
+    """One json file per response, sharded into subdirectories by the first two characters of the key."""
+
+    def __init__(self, directory: str | Path, ttl: float | None = None):
+        self.directory = Path(directory).expanduser()
+        self.ttl = ttl
+
+    def _path(self, key: str):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            if self.ttl is not None and path.stat().st_mtime + self.ttl <= time():
+                return None
+            return loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, chunks: list[str]):
+        path = self._path(key)
+        temp = path.with_name(f"{path.name}.{getpid()}.{get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp.write_text(dumps(chunks))
+            replace(temp, path)  # atomic, so concurrent workers never read a partial file
+        except OSError:
+            temp.unlink(missing_ok=True)
+
+
+class SQLiteBackend:
+    """A single database file, which suits many small responses better than a directory of files."""
+
+    def __init__(self, path: str | Path, ttl: float | None = None):
+        import sqlite3
+
+        self.ttl = ttl
+        self._lock = Lock()
+        self._connection = sqlite3.connect(Path(path).expanduser(), check_same_thread=False, isolation_level=None)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, chunks TEXT, created REAL)")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._connection.execute("SELECT chunks, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or self.ttl is not None and row[1] + self.ttl <= time():
+            return None
+        return loads(row[0])
+
+    def set(self, key: str, chunks: list[str]):
+        with self._lock:
+            self._connection.execute("REPLACE INTO responses VALUES (?, ?, ?)", (key, dumps(chunks), time()))
+
+    def close(self):
+        self._connection.close()
+
+
+class _Abandoned(Exception):
+    """the caller which was fetching a response stopped before it completed"""
+
+
+class ResponseCache:
+    """A backend plus the bookkeeping for single-flight, shared by every wrapper created from it.
+
+    While a response is being fetched, identical calls wait for it instead of sending their own request.
+    """
+
+    def __init__(self, backend: CacheBackend | None = None):
+        self.backend = MemoryBackend() if backend is None else backend
+        self.hits = self.misses = 0
+        self._inflight: dict[str, tuple[Future[list[str]], tuple]] = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def make_key(prompt: str | list[Message], config: dict[str, Any]):
+        config = {key: value for key, value in config.items() if key != "stream"}
+        normalised = dumps([prompt, config], sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=repr)
+        return sha256(normalised.encode()).hexdigest()
+
+    def _claim(self, key: str) -> tuple[list[str] | None, Future[list[str]] | None, bool]:
+        """returns the cached chunks, or the future to wait for or resolve, and whether this caller has to resolve it"""
+
+        if (chunks := self.backend.get(key)) is not None:
+            self.hits += 1
+            return chunks, None, False
+
+        owner = _owner()
+        with self._lock:
+            if (inflight := self._inflight.get(key)) is not None:
+                if inflight[1] == owner:
+                    # the same thread or task interleaves identical streams, waiting for itself would never end
+                    self.misses += 1
+                    return None, None, False
+                self.hits += 1
+                return None, inflight[0], False
+            if (chunks := self.backend.get(key)) is not None:  # resolved right after the first lookup
+                self.hits += 1
+                return chunks, None, False
+            self.misses += 1
+            future = Future()
+            self._inflight[key] = future, owner
+            return None, future, True
+
+    def _resolve(self, key: str, future: Future[list[str]], chunks: list[str] | None, error: BaseException | None = None):
+        """waiters get the leader's exception, but not a cancellation or an early close, they retry instead"""
+        try:
+            if chunks is not None:
+                self.backend.set(key, chunks)
+        except Exception:  # the response is still good, only later calls will miss it
+            logger.exception("failed to cache the response for %s", key)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            if chunks is not None:
+                future.set_result(chunks)
+            else:
+                future.set_exception(error if isinstance(error, Exception) else _Abandoned())
+
+    def clear(self):
+        """forget the counters, the backend is left untouched"""
+        self.hits = self.misses = 0
+
+
+def _owner():
+    try:
+        return get_ident(), current_task()
+    except RuntimeError:
+        return get_ident(), None
+
+
+def _bound_config(function) -> dict[str, Any]:
+    """the run config bound to a client, like `ChatComplete().bind(model=...)`, is part of the request too"""
+    return getattr(getattr(function, "__self__", function), "_run_config", {})
+
+
+def _is_async(function) -> bool:
+    return iscoroutinefunction(function) or iscoroutinefunction(getattr(function, "__call__", None))
+
+
+def _is_async_gen(function) -> bool:
+    return isasyncgenfunction(function) or isasyncgenfunction(getattr(function, "__call__", None))
+
+
+class CachedComplete:
+    def __init__(self, complete: Complete, cache: ResponseCache | None = None):
+        self.complete = complete
+        self.cache = ResponseCache() if cache is None else cache
+
+    def __call__(self, prompt, /, **config) -> str:
+        key = self.cache.make_key(prompt, _bound_config(self.complete) | config)
+        while True:
+            chunks, future, leader = self.cache._claim(key)
+            if chunks is not None:
+                return "".join(chunks)
+            if future is None:
+                return self.complete(prompt, **config)
+            if not leader:
+                try:
+                    return "".join(future.result())
+                except _Abandoned:
+                    continue
+            try:
+                result = self.complete(prompt, **config)
+            except BaseException as e:
+                self.cache._resolve(key, future, None, e)
+                raise
+            self.cache._resolve(key, future, [result])
+            return result
+
+
+class CachedAsyncComplete:
+    def __init__(self, complete: AsyncComplete, cache: ResponseCache | None = None):
+        self.complete = complete
+        self.cache = ResponseCache() if cache is None else cache
+
+    async def __call__(self, prompt, /, **config) -> str:
+        key = self.cache.make_key(prompt, _bound_config(self.complete) | config)
+        while True:
+            chunks, future, leader = self.cache._claim(key)
+            if chunks is not None:
+                return "".join(chunks)
+            if future is None:
+                return await self.complete(prompt, **config)
+            if not leader:
+                try:
+                    return "".join(await shield(wrap_future(future)))  # a cancelled waiter mustn't cancel the others
+                except _Abandoned:
+                    continue
+            try:
+                result = await self.complete(prompt, **config)
+            except BaseException as e:
+                self.cache._resolve(key, future, None, e)
+                raise
+            self.cache._resolve(key, future, [result])
+            return result
+
+
+class CachedGenerate:
+    def __init__(self, generate: Generate, cache: ResponseCache | None = None):
+        self.generate = generate
+        self.cache = ResponseCache() if cache is None else cache
+
+    def __call__(self, prompt, /, **config):
+        key = self.cache.make_key(prompt, _bound_config(self.generate) | config)
+        while True:
+            chunks, future, leader = self.cache._claim(key)
+            if chunks is not None:
+                yield from chunks
+                return
+            if future is None:
+                yield from self.generate(prompt, **config)
+                return
+            if not leader:
+                try:
+                    yield from future.result()
+                    return
+                except _Abandoned:
+                    continue
+
+            chunks = []
+            try:
+                for chunk in self.generate(prompt, **config):
+                    chunks.append(chunk)
+                    yield chunk
+            except BaseException as e:  # including `GeneratorExit` when the consumer stops early
+                self.cache._resolve(key, future, None, e)
+                raise
+            self.cache._resolve(key, future, chunks)
+            return
+
+
+class CachedAsyncGenerate:
+    def __init__(self, generate: AsyncGenerate, cache: ResponseCache | None = None):
+        self.generate = generate
+        self.cache = ResponseCache() if cache is None else cache
+
+    async def __call__(self, prompt, /, **config):
+        key = self.cache.make_key(prompt, _bound_config(self.generate) | config)
+        while True:
+            chunks, future, leader = self.cache._claim(key)
+            if chunks is not None:
+                for chunk in chunks:
+                    yield chunk
+                return
+            if future is None:
+                async for chunk in self.generate(prompt, **config):
+                    yield chunk
+                return
+            if not leader:
+                try:
+                    for chunk in await shield(wrap_future(future)):
+                        yield chunk
+                    return
+                except _Abandoned:
+                    continue
+
+            chunks = []
+            try:
+                async for chunk in self.generate(prompt, **config):
+                    chunks.append(chunk)
+                    yield chunk
+            except BaseException as e:  # including `GeneratorExit` when the consumer stops early
+                self.cache._resolve(key, future, None, e)
+                raise
+            self.cache._resolve(key, future, chunks)
+            return
+
+
+def cached_complete(complete: Complete | AsyncComplete, cache: ResponseCache | None = None):
+    if _is_async(complete):
+        return CachedAsyncComplete(complete, cache)  # type: ignore
+    return CachedComplete(complete, cache)  # type: ignore
+
+
+def cached_generate(generate: Generate | AsyncGenerate, cache: ResponseCache | None = None):
+    if _is_async_gen(generate):
+        return CachedAsyncGenerate(generate, cache)  # type: ignore
+    return CachedGenerate(generate, cache)  # type: ignore
+
+
+class CachedLLM(LLM):
+    """Wraps both methods of an `LLM` with one shared cache, usable as `Node.llm`."""
+
+    def __init__(self, llm: LLM, cache: ResponseCache | None = None):
+        self.llm = llm
+        self.cache = ResponseCache() if cache is None else cache
+        self.complete = cached_complete(llm.complete, self.cache)  # type: ignore
+        self.generate = cached_generate(llm.generate, self.cache)  # type: ignore
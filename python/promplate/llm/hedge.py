@@ -0,0 +1,217 @@
+"""Hedged requests: when a completion is slow, send a backup and take whichever answer comes first.
+
+They also honour a `deadline` in the call config, an absolute `time.time()` after which the call raises `TimeoutError`.
+Since `Node` passes its invoke config on to `complete`, `node.ainvoke(context, deadline=time() + 5)` bounds the whole call.
+"""
+
+from asyncio import FIRST_COMPLETED as FIRST_TASK
+from asyncio import Task
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import create_task, sleep
+from asyncio import wait as await_first
+from asyncio import wait_for
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from time import monotonic
+from time import sleep as block
+from time import time
+
+from ..chain.utils import resolve
+from .base import *
+from .cache import _is_async, _is_async_gen
+from .router import is_transient
+
+
+def _stop_at(deadline: float | None):
+    """the `monotonic()` equivalent of an absolute deadline"""
+    return None if deadline is None else monotonic() + deadline - time()
+
+
+class _Hedging:
+    def __init__(self, delay: float | None = None, percentile: float | None = 95, min_samples=20, max_hedges=1, window=256):
+        """send a backup after a fixed `delay`, or once the latency `percentile` observed so far has passed
+
+        Until `min_samples` latencies were observed, only a fixed `delay` hedges.
+        A failed attempt is only retried as the next hedge, and only if it `is_transient`, anything else raises.
+        """
+
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedges = max_hedges
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.calls = self.hedged = self.backup_wins = 0
+
+    def hedge_delay(self):
+        if self.delay is not None:
+            return self.delay
+        if self.percentile is None or len(self.latencies) < self.min_samples:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[round(self.percentile / 100 * (len(latencies) - 1))]
+
+    def _next_wait(self, hedges: int, last_launch: float, stop: float | None):
+        """seconds until the next hedge or the deadline, whichever comes first, and whether it is the deadline"""
+
+        delay = self.hedge_delay() if hedges < self.max_hedges else None
+        hedge_at = None if delay is None else last_launch + delay
+        if stop is not None and (hedge_at is None or stop <= hedge_at):
+            return max(stop - monotonic(), 0), True
+        return None if hedge_at is None else max(hedge_at - monotonic(), 0), False
+
+    def _gives_up(self, error: BaseException, running: bool, hedges: int, last_launch: float, stop: float | None):
+        """a failure waits for the others or for the next hedge, but only if another attempt may succeed"""
+        if not is_transient(error):
+            return True
+        if running:
+            return False
+        timeout, is_deadline = self._next_wait(hedges, last_launch, stop)
+        return timeout is None or is_deadline
+
+    def _won(self, index: int, started: float):
+        """measured from when the primary was sent, as a caller waited all along, not just for the winner"""
+        self.latencies.append(monotonic() - started)
+        if index:
+            self.backup_wins += 1
+
+
+class HedgedComplete(_Hedging):
+    """Hedges a blocking `Complete` with threads. The slower request can't be cancelled, so its answer is dropped."""
+
+    def __init__(self, complete: Complete, delay: float | None = None, percentile: float | None = 95, **options):
+        super().__init__(delay, percentile, **options)
+        self.complete = complete
+        self._executor = ThreadPoolExecutor(thread_name_prefix="hedge")
+
+    def __call__(self, prompt, /, deadline: float | None = None, **config) -> str:
+        self.calls += 1
+        stop = _stop_at(deadline)
+        attempts: dict[Future[str], int] = {}
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            attempts[self._executor.submit(self.complete, prompt, **config)] = launched
+            launched += 1
+            return monotonic()
+
+        started = last_launch = launch()
+        try:
+            while True:
+                timeout, is_deadline = self._next_wait(launched - 1, last_launch, stop)
+                if attempts:
+                    done, _ = wait(attempts, timeout, FIRST_COMPLETED)
+                else:
+                    block(timeout)  # the last one failed transiently, it is retried as the next hedge
+                    done = ()
+
+                for future in done:
+                    index = attempts.pop(future)
+                    if (error := future.exception()) is None:
+                        self._won(index, started)
+                        return future.result()
+                    if self._gives_up(error, bool(attempts), launched - 1, last_launch, stop):
+                        raise error
+
+                if not done:
+                    if is_deadline:
+                        raise TimeoutError("deadline exceeded")
+                    self.hedged += 1
+                    last_launch = launch()
+        finally:
+            for future in attempts:
+                future.cancel()
+
+
+class AsyncHedgedComplete(_Hedging):
+    """Hedges an `AsyncComplete`, cancelling the slower request."""
+
+    def __init__(self, complete: AsyncComplete, delay: float | None = None, percentile: float | None = 95, **options):
+        super().__init__(delay, percentile, **options)
+        self.complete = complete
+
+    async def __call__(self, prompt, /, deadline: float | None = None, **config) -> str:
+        self.calls += 1
+        stop = _stop_at(deadline)
+        attempts: dict[Task[str], int] = {}
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            attempts[create_task(resolve(self.complete(prompt, **config)))] = launched
+            launched += 1
+            return monotonic()
+
+        started = last_launch = launch()
+        try:
+            while True:
+                timeout, is_deadline = self._next_wait(launched - 1, last_launch, stop)
+                if attempts:
+                    done, _ = await await_first(attempts, timeout=timeout, return_when=FIRST_TASK)
+                else:
+                    await sleep(timeout)  # the last one failed transiently, it is retried as the next hedge
+                    done = ()
+
+                for task in done:
+                    index = attempts.pop(task)
+                    if (error := task.exception()) is None:
+                        self._won(index, started)
+                        return task.result()
+                    if self._gives_up(error, bool(attempts), launched - 1, last_launch, stop):
+                        raise error
+
+                if not done:
+                    if is_deadline:
+                        raise TimeoutError("deadline exceeded")
+                    self.hedged += 1
+                    last_launch = launch()
+        finally:
+            for task in attempts:
+                task.cancel()
+
+
+class DeadlineGenerate:
+    """Streams aren't hedged, but they honour `deadline` too, checked whenever a chunk arrives."""
+
+    def __init__(self, generate: Generate):
+        self.generate = generate
+
+    def __call__(self, prompt, /, deadline: float | None = None, **config):
+        for chunk in self.generate(prompt, **config):
+            if deadline is not None and time() > deadline:
+                raise TimeoutError("deadline exceeded")
+            yield chunk
+
+
+class AsyncDeadlineGenerate:
+    """Streams aren't hedged, but they honour `deadline` too, without waiting for a chunk which comes too late."""
+
+    def __init__(self, generate: AsyncGenerate):
+        self.generate = generate
+
+    async def __call__(self, prompt, /, deadline: float | None = None, **config):
+        stream = aiter(self.generate(prompt, **config))
+        stop = _stop_at(deadline)
+        while True:
+            try:
+                chunk = await wait_for(anext(stream), None if stop is None else max(stop - monotonic(), 0))
+            except StopAsyncIteration:
+                return
+            except AsyncTimeoutError:  # a different class before python 3.11
+                raise TimeoutError("deadline exceeded") from None
+            yield chunk
+
+
+class HedgedLLM(LLM):
+    """Hedges `complete` and bounds both methods by `deadline`, usable as `Node.llm`."""
+
+    def __init__(self, llm: LLM, delay: float | None = None, percentile: float | None = 95, **options):
+        self.llm = llm
+        if _is_async(llm.complete):
+            self.complete = AsyncHedgedComplete(llm.complete, delay, percentile, **options)  # type: ignore
+        else:
+            self.complete = HedgedComplete(llm.complete, delay, percentile, **options)  # type: ignore
+        if _is_async_gen(llm.generate):
+            self.generate = AsyncDeadlineGenerate(llm.generate)  # type: ignore
+        else:
+            self.generate = DeadlineGenerate(llm.generate)  # type: ignore
@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 from copy import copy
 from functools import cached_property
 from types import MappingProxyType
@@ -8,16 +9,37 @@ from openai import AsyncClient, Client  # type: ignore
 from ...prompt.chat import Message, ensure
 from ...prompt.utils import _get_aclient, _get_client, get_user_agent
 from ..base import *
+from ..ratelimit import RateLimit, estimate_tokens, governor
 
 P = ParamSpec("P")
 T = TypeVar("T")
 
 
 class Config(Configurable):
+    _rate_limit: RateLimit | None = None
+    """requests and estimated tokens per minute, shared by every client using the same endpoint, api key and model"""
+
+    _max_in_flight: int | None = None
+    """concurrent requests, shared by every client using the same endpoint"""
+
     def __init__(self, **config):
         super().__init__(**config)
         self._run_config = {}
 
+    def _limiter(self, client: Client | AsyncClient, config: dict):
+        if self._rate_limit is not None or self._max_in_flight is not None:
+            return governor.get(str(client.base_url), client.api_key, config.get("model"), self._rate_limit, self._max_in_flight)
+
+    def _limit(self, config: dict):
+        """block until the request fits the limits"""
+        limiter = self._limiter(self._client, config)
+        return nullcontext() if limiter is None else limiter.limit(estimate_tokens(config))
+
+    def _alimit(self, config: dict):
+        """wait until the request fits the limits"""
+        limiter = self._limiter(self._aclient, config)
+        return nullcontext() if limiter is None else limiter.alimit(estimate_tokens(config))
+
     def bind(self, **run_config):
         obj = copy(self)
         obj._run_config = self._run_config | run_config
@@ -70,44 +92,49 @@ else:
 class TextComplete(ClientConfig):
     def __call__(self, text: str, /, **config):
         config = self._run_config | config | {"stream": False, "prompt": text}
-        result = self._client.completions.create(**config)
+        with self._limit(config):
+            result = self._client.completions.create(**config)
         return result.choices[0].text
 
 
 class AsyncTextComplete(AsyncClientConfig):
     async def __call__(self, text: str, /, **config):
         config = self._run_config | config | {"stream": False, "prompt": text}
-        result = await self._aclient.completions.create(**config)
+        async with self._alimit(config):
+            result = await self._aclient.completions.create(**config)
         return result.choices[0].text
 
 
 class TextGenerate(ClientConfig):
     def __call__(self, text: str, /, **config):
         config = self._run_config | config | {"stream": True, "prompt": text}
-        stream = self._client.completions.create(**config)
-        for event in stream:
-            try:
-                yield event.choices[0].text
-            except AttributeError:
-                pass
+        with self._limit(config):  # the slot is held until the stream ends
+            stream = self._client.completions.create(**config)
+            for event in stream:
+                try:
+                    yield event.choices[0].text
+                except AttributeError:
+                    pass
 
 
 class AsyncTextGenerate(AsyncClientConfig):
     async def __call__(self, text: str, /, **config):
         config = self._run_config | config | {"stream": True, "prompt": text}
-        stream = await self._aclient.completions.create(**config)
-        async for event in stream:
-            try:
-                yield event.choices[0].text
-            except AttributeError:
-                pass
+        async with self._alimit(config):  # the slot is held until the stream ends
+            stream = await self._aclient.completions.create(**config)
+            async for event in stream:
+                try:
+                    yield event.choices[0].text
+                except AttributeError:
+                    pass
 
 
 class ChatComplete(ClientConfig):
     def __call__(self, messages: list[Message] | str, /, **config):
         messages = ensure(messages)
         config = self._run_config | config | {"stream": False, "messages": messages}
-        result = self._client.chat.completions.create(**config)
+        with self._limit(config):
+            result = self._client.chat.completions.create(**config)
         return result.choices[0].message.content
 
 
@@ -115,7 +142,8 @@ class AsyncChatComplete(AsyncClientConfig):
     async def __call__(self, messages: list[Message] | str, /, **config):
         messages = ensure(messages)
         config = self._run_config | config | {"stream": False, "messages": messages}
-        result = await self._aclient.chat.completions.create(**config)
+        async with self._alimit(config):
+            result = await self._aclient.chat.completions.create(**config)
         return result.choices[0].message.content
 
 
@@ -123,24 +151,26 @@ class ChatGenerate(ClientConfig):
     def __call__(self, messages: list[Message] | str, /, **config):
         messages = ensure(messages)
         config = self._run_config | config | {"stream": True, "messages": messages}
-        stream = self._client.chat.completions.create(**config)
-        for event in stream:
-            try:
-                yield event.choices[0].delta.content or ""
-            except AttributeError:
-                pass
+        with self._limit(config):  # the slot is held until the stream ends
+            stream = self._client.chat.completions.create(**config)
+            for event in stream:
+                try:
+                    yield event.choices[0].delta.content or ""
+                except AttributeError:
+                    pass
 
 
 class AsyncChatGenerate(AsyncClientConfig):
     async def __call__(self, messages: list[Message] | str, /, **config):
         messages = ensure(messages)
         config = self._run_config | config | {"stream": True, "messages": messages}
-        stream = await self._aclient.chat.completions.create(**config)
-        async for event in stream:
-            try:
-                yield event.choices[0].delta.content or ""
-            except AttributeError:
-                pass
+        async with self._alimit(config):  # the slot is held until the stream ends
+            stream = await self._aclient.chat.completions.create(**config)
+            async for event in stream:
+                try:
+                    yield event.choices[0].delta.content or ""
+                except AttributeError:
+                    pass
 
 
 class SyncTextOpenAI(ClientConfig, LLM):
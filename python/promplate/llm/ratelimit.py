@@ -0,0 +1,249 @@
+"""Client-side rate limiting, so requests queue up locally instead of bouncing off 429s.
+
+Token buckets refill continuously. A caller reserves its share up front and then sleeps off any deficit,
+so waiting callers are served in arrival order, and the same bucket works for threads and coroutines alike.
+"""
+
+from asyncio import Future, get_running_loop
+from asyncio import sleep as asleep
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from json import dumps
+from threading import Event, Lock
+from time import monotonic, sleep
+from typing import Any, Callable, NamedTuple
+
+
+class RateLimit(NamedTuple):
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+    """estimated from the prompt's length plus `max_tokens`"""
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.per_minute = self.level = per_minute
+        self.updated = monotonic()
+        self._lock = Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """take `amount` out of the bucket, returning how long to wait before using it"""
+
+        with self._lock:
+            now = monotonic()
+            self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+            self.updated = now
+            self.level -= min(amount, self.per_minute)  # larger requests would never fit otherwise
+            return 0.0 if self.level >= 0 else -self.level * 60 / self.per_minute
+
+    def retune(self, per_minute: float):
+        """change the rate, keeping what is left in the bucket instead of refilling it"""
+
+        with self._lock:
+            now = monotonic()
+            self.level = min(per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+            self.updated = now
+            self.per_minute = per_minute
+
+
+class InflightLimit:
+    """A semaphore which threads and coroutines (on any event loop) can share, handing slots out in arrival order."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: deque[list] = deque()  # [granted, wake]
+        self._lock = Lock()
+
+    def resize(self, limit: int):
+        """change the limit, handing the slots it frees up to the waiters right away"""
+
+        with self._lock:
+            self.limit = limit
+            woken = []
+            while self._waiters and self.active < limit:
+                waiter = self._waiters.popleft()
+                waiter[0] = True
+                self.active += 1
+                woken.append(waiter[1])
+        for wake in woken:
+            wake()
+
+    def _enqueue(self, wake: Callable[[], Any]):
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return None
+            waiter = [False, wake]
+            self._waiters.append(waiter)
+            return waiter
+
+    def acquire(self):
+        event = Event()
+        if self._enqueue(event.set) is not None:
+            event.wait()
+
+    async def aacquire(self):
+        loop = get_running_loop()
+        future: Future[None] = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        if (waiter := self._enqueue(wake)) is None:
+            return
+        try:
+            await future
+        except BaseException:
+            with self._lock:
+                granted = waiter[0]
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                self.release()  # the slot was handed over right as this got cancelled
+            raise
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter[0] = True  # the slot passes straight to it, so `active` stays the same
+            else:
+                self.active -= 1
+                return
+        waiter[1]()
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+
+class LimiterStats(NamedTuple):
+    calls: int
+    waited: int
+    """calls which had to wait at all"""
+    total_wait: float
+    max_wait: float
+
+
+class RateLimiter:
+    """The buckets of one (endpoint, api key, model), plus the in-flight cap of the endpoint."""
+
+    def __init__(self, rate: RateLimit | None = None, inflight: InflightLimit | None = None):
+        self.requests = self.tokens = None
+        self.configure(rate)
+        self.inflight = inflight
+        self.calls = self.waited = 0
+        self.total_wait = self.max_wait = 0.0
+
+    def configure(self, rate: RateLimit | None):
+        requests_per_minute, tokens_per_minute = rate or RateLimit()
+        self.requests = _retuned(self.requests, requests_per_minute)
+        self.tokens = _retuned(self.tokens, tokens_per_minute)
+
+    def _reserve(self, tokens: float):
+        delay = 0.0
+        if self.requests is not None:
+            delay = self.requests.reserve()
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def _record(self, wait: float):
+        self.calls += 1
+        if wait > 1e-3:
+            self.waited += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    @contextmanager
+    def limit(self, tokens: float = 0):
+        start = monotonic()
+        if self.inflight is not None:
+            self.inflight.acquire()
+        try:
+            if delay := self._reserve(tokens):
+                sleep(delay)
+            self._record(monotonic() - start)
+            yield
+        finally:
+            if self.inflight is not None:
+                self.inflight.release()
+
+    @asynccontextmanager
+    async def alimit(self, tokens: float = 0):
+        start = monotonic()
+        if self.inflight is not None:
+            await self.inflight.aacquire()
+        try:
+            if delay := self._reserve(tokens):
+                await asleep(delay)
+            self._record(monotonic() - start)
+            yield
+        finally:
+            if self.inflight is not None:
+                self.inflight.release()
+
+    def stats(self):
+        return LimiterStats(self.calls, self.waited, self.total_wait, self.max_wait)
+
+
+def _retuned(bucket: TokenBucket | None, per_minute: float | None):
+    if per_minute is None or bucket is None:
+        return None if per_minute is None else TokenBucket(per_minute)
+    if bucket.per_minute != per_minute:
+        bucket.retune(per_minute)
+    return bucket
+
+
+class Governor:
+    """Hands out the limiters, so every client pointing at the same endpoint shares them.
+
+    Limits are taken from the latest caller which sets them, so reconfiguring a client takes effect for everyone
+    using that endpoint, while a client leaving `rate` or `max_in_flight` as `None` keeps the ones already in place.
+    """
+
+    def __init__(self):
+        self.limiters: dict[tuple[str, str | None, str | None], RateLimiter] = {}
+        self.inflight: dict[str, InflightLimit] = {}
+        self._lock = Lock()
+
+    def get(self, endpoint: str, api_key: str | None, model: str | None, rate: RateLimit | None, max_in_flight: int | None):
+        with self._lock:
+            if (inflight := self.inflight.get(endpoint)) is None and max_in_flight is not None:
+                inflight = self.inflight[endpoint] = InflightLimit(max_in_flight)
+            elif inflight is not None and max_in_flight is not None and inflight.limit != max_in_flight:
+                inflight.resize(max_in_flight)
+
+            if (limiter := self.limiters.get(key := (endpoint, api_key, model))) is None:
+                limiter = self.limiters[key] = RateLimiter(rate, inflight)
+            else:
+                if rate is not None:
+                    limiter.configure(rate)
+                limiter.inflight = inflight
+
+            return limiter
+
+    def stats(self):
+        """per (endpoint, api key, model), api keys are masked"""
+        return {(endpoint, _mask(key), model): limiter.stats() for (endpoint, key, model), limiter in self.limiters.items()}
+
+    def clear(self):
+        with self._lock:
+            self.limiters.clear()
+            self.inflight.clear()
+
+
+def _mask(api_key: str | None):
+    return api_key if api_key is None else f"{api_key[:3]}...{api_key[-4:]}"
+
+
+def estimate_tokens(config: dict[str, Any]):
+    """roughly 4 characters per token for the prompt or messages, plus the completion budget"""
+
+    prompt = config.get("messages", config.get("prompt", ""))
+    length = len(prompt) if isinstance(prompt, str) else len(dumps(prompt, ensure_ascii=False, default=str))
+    return length / 4 + (config.get("max_tokens") or config.get("max_completion_tokens") or 0)
+
+
+governor = Governor()  # shared by every client in the process
@@ -0,0 +1,248 @@
+"""Spread requests over several equivalent backends, like OpenAI-compatible endpoints in different regions.
+
+A backend which keeps failing gets its circuit opened: it is skipped for `cooldown` seconds,
+then a single trial request decides whether it rejoins. Requests failing in a way another backend may not,
+like a timeout or a 5xx, fail over to the next backend, streams only until their first chunk,
+as chunks which were already yielded can't be taken back.
+"""
+
+from threading import Lock
+from time import monotonic
+from typing import Callable, Iterable, Literal, NoReturn
+
+from .base import *
+
+Strategy = Literal["round_robin", "least_outstanding", "latency"]
+
+_transient_error_names = frozenset(("APIConnectionError", "TransportError"))  # from openai and httpx, including timeouts
+
+
+def is_transient(error: BaseException) -> bool:
+    """whether another backend may well succeed: connection errors, timeouts, 429 and 5xx responses
+
+    Anything else, like a malformed request or a bad api key, would fail the same way everywhere.
+    """
+
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if any(cls.__name__ in _transient_error_names for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+class Backend:
+    def __init__(self, llm: LLM, weight: float = 1, name: str | None = None):
+        self.llm = llm
+        self.weight = weight
+        self.name = name or repr(llm)
+
+        self.outstanding = 0
+        self.latency: float | None = None
+        """moving average in seconds, of the whole response for `complete` and of the first chunk for `generate`"""
+        self.failures = 0
+        """consecutive ones"""
+        self.opened_at: float | None = None
+        self.trial = False
+        self._current = 0.0  # for smooth weighted round-robin
+
+    @property
+    def state(self):
+        return "closed" if self.opened_at is None else "half-open" if self.trial else "open"
+
+    def __repr__(self):
+        return f"<Backend {self.name} {self.state}>"
+
+
+class _Router(LLM):
+    def __init__(
+        self,
+        backends: Iterable[Backend | LLM],
+        strategy: Strategy = "round_robin",
+        failure_threshold=3,
+        cooldown=30.0,
+        smoothing=0.3,
+        failover_on: tuple[type[BaseException], ...] | Callable[[BaseException], bool] = is_transient,
+    ):
+        """errors matching `failover_on` count against the backend and move on to the next one, others are raised"""
+
+        self.backends = [backend if isinstance(backend, Backend) else Backend(backend) for backend in backends]
+        assert self.backends, "a router needs at least one backend"
+        self.strategy: Strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.failover_on = failover_on
+        self._lock = Lock()
+
+    def _available(self, backend: Backend, now: float):
+        if backend.opened_at is None:
+            return True
+        return not backend.trial and now - backend.opened_at >= self.cooldown  # half-open: a single trial goes through
+
+    def _fails_over(self, error: BaseException):
+        if isinstance(self.failover_on, tuple):
+            return isinstance(error, self.failover_on)
+        return isinstance(error, Exception) and self.failover_on(error)
+
+    def _plan(self):
+        """available backends in the order to try them, each paired with when it started"""
+
+        with self._lock:
+            order = self._order(monotonic())
+
+        for backend in order:
+            with self._lock:  # checked again, as a concurrent request may have claimed a half-open trial meanwhile
+                if not self._available(backend, monotonic()):
+                    continue
+                backend.outstanding += 1
+                if backend.opened_at is not None:
+                    backend.trial = True
+            yield backend, monotonic()
+
+    def _order(self, now: float):
+        """called under the lock"""
+
+        candidates = [backend for backend in self.backends if self._available(backend, now)]
+        if not candidates:
+            return []
+
+        match self.strategy:
+            case "round_robin":
+                total = sum(backend.weight for backend in candidates)
+                for backend in candidates:
+                    backend._current += backend.weight
+                chosen = max(candidates, key=lambda backend: backend._current)
+                chosen._current -= total
+                rest = sorted((backend for backend in candidates if backend is not chosen), key=lambda b: -b.weight)
+                return [chosen, *rest]
+            case "least_outstanding":
+                return sorted(candidates, key=lambda backend: backend.outstanding / backend.weight)
+            case "latency":  # untried backends first, so every one gets measured
+                return sorted(candidates, key=lambda backend: (backend.latency or 0.0, backend.outstanding))
+
+        raise ValueError(self.strategy)
+
+    def _finish(self, backend: Backend):
+        with self._lock:
+            backend.outstanding -= 1
+
+    def _succeed(self, backend: Backend, started: float):
+        with self._lock:
+            latency = monotonic() - started
+            backend.latency = (
+                latency if backend.latency is None else backend.latency + self.smoothing * (latency - backend.latency)
+            )
+            backend.failures = 0
+            backend.opened_at, backend.trial = None, False
+
+    def _fail(self, backend: Backend):
+        with self._lock:
+            backend.failures += 1
+            if backend.trial or backend.failures >= self.failure_threshold:
+                backend.opened_at, backend.trial = monotonic(), False
+
+    def _release(self, backend: Backend):
+        """the request ended without telling anything about the backend's health, like when it got cancelled"""
+        with self._lock:
+            backend.trial = False
+
+    def _give_up(self, error: BaseException | None) -> NoReturn:
+        if error is None:
+            raise RuntimeError("every backend's circuit is open")
+        raise error
+
+
+class SyncRouter(_Router):
+    """Routes over backends with blocking `complete` and `generate`, such as `SyncChatOpenAI`."""
+
+    def complete(self, prompt, /, **config):
+        error = None
+        for backend, started in self._plan():
+            try:
+                result = backend.llm.complete(prompt, **config)
+            except BaseException as e:
+                if not self._fails_over(e):
+                    self._release(backend)
+                    raise
+                self._fail(backend)
+                error = e
+                continue
+            finally:
+                self._finish(backend)
+            self._succeed(backend, started)
+            return result
+        self._give_up(error)
+
+    def generate(self, prompt, /, **config):
+        error = None
+        for backend, started in self._plan():
+            try:
+                try:
+                    stream = iter(backend.llm.generate(prompt, **config))
+                    first = next(stream)
+                except StopIteration:
+                    self._succeed(backend, started)
+                    return
+                except BaseException as e:
+                    if not self._fails_over(e):
+                        self._release(backend)
+                        raise
+                    self._fail(backend)
+                    error = e
+                    continue
+                self._succeed(backend, started)
+                yield first
+                yield from stream
+                return
+            finally:
+                self._finish(backend)  # a stream stays outstanding until it ends
+        self._give_up(error)
+
+
+class AsyncRouter(_Router):
+    """Routes over backends with async `complete` and `generate`, such as `AsyncChatOpenAI`."""
+
+    async def complete(self, prompt, /, **config):
+        error = None
+        for backend, started in self._plan():
+            try:
+                result = await backend.llm.complete(prompt, **config)  # type: ignore
+            except BaseException as e:
+                if not self._fails_over(e):
+                    self._release(backend)
+                    raise
+                self._fail(backend)
+                error = e
+                continue
+            finally:
+                self._finish(backend)
+            self._succeed(backend, started)
+            return result
+        self._give_up(error)
+
+    async def generate(self, prompt, /, **config):
+        error = None
+        for backend, started in self._plan():
+            try:
+                try:
+                    stream = aiter(backend.llm.generate(prompt, **config))  # type: ignore
+                    first = await anext(stream)
+                except StopAsyncIteration:
+                    self._succeed(backend, started)
+                    return
+                except BaseException as e:
+                    if not self._fails_over(e):
+                        self._release(backend)
+                        raise
+                    self._fail(backend)
+                    error = e
+                    continue
+                self._succeed(backend, started)
+                yield first
+                async for chunk in stream:
+                    yield chunk
+                return
+            finally:
+                self._finish(backend)  # a stream stays outstanding until it ends
+        self._give_up(error)
@@ -0,0 +1,108 @@
+"""Share one upstream request among concurrent identical calls, like a thundering herd after a deploy.
+
+Unlike the cache, nothing outlives the request: once it finishes, the next identical call sends a new one.
+Both wrappers are for coroutine based callables, and calls are only shared within one event loop.
+"""
+
+from asyncio import Queue, Task, create_task, shield
+from typing import Any
+
+from .base import *
+from .cache import ResponseCache
+
+
+class CoalescedComplete:
+    def __init__(self, complete: AsyncComplete):
+        self.complete = complete
+        self._inflight: dict[str, tuple[Task[str], list[int]]] = {}
+
+    async def __call__(self, prompt, /, **config) -> str:
+        key = ResponseCache.make_key(prompt, config)
+
+        if (inflight := self._inflight.get(key)) is None:
+            task = create_task(self.complete(prompt, **config))
+            inflight = self._inflight[key] = task, [0]
+            task.add_done_callback(lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is inflight else None)
+
+        task, waiters = inflight
+        waiters[0] += 1
+        try:
+            return await shield(task)  # one caller being cancelled mustn't cancel the others
+        finally:
+            waiters[0] -= 1
+            if not waiters[0] and not task.done():
+                task.cancel()  # nobody is waiting anymore
+                self._inflight.pop(key, None)
+
+
+_end = object()
+
+
+class _Broadcast:
+    """one upstream stream, copied into a queue per subscriber, so a slow subscriber never holds back the others"""
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.subscribers: list[Queue[Any]] = []
+        self.task: Task | None = None
+        self.end: Any = None
+
+    def subscribe(self):
+        queue: Queue[Any] = Queue()
+        for chunk in self.chunks:  # late subscribers catch up first
+            queue.put_nowait(chunk)
+        if self.end is not None:
+            queue.put_nowait(self.end)  # joined right after the stream ended
+        self.subscribers.append(queue)
+        return queue
+
+    async def pump(self, stream: AsyncIterable[str]):
+        end: Any = _end
+        try:
+            async for chunk in stream:
+                self.chunks.append(chunk)
+                for queue in self.subscribers:
+                    queue.put_nowait(chunk)
+        except Exception as e:
+            end = e
+        finally:
+            self.end = end
+            for queue in self.subscribers:
+                queue.put_nowait(end)
+
+
+class CoalescedGenerate:
+    def __init__(self, generate: AsyncGenerate):
+        self.generate = generate
+        self._inflight: dict[str, _Broadcast] = {}
+
+    async def __call__(self, prompt, /, **config):
+        key = ResponseCache.make_key(prompt, config)
+
+        if (broadcast := self._inflight.get(key)) is None:
+            broadcast = self._inflight[key] = _Broadcast()
+            broadcast.task = create_task(broadcast.pump(self.generate(prompt, **config)))
+            broadcast.task.add_done_callback(
+                lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is broadcast else None
+            )
+
+        queue = broadcast.subscribe()
+        try:
+            while (chunk := await queue.get()) is not _end:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            broadcast.subscribers.remove(queue)
+            if not broadcast.subscribers and broadcast.task is not None and not broadcast.task.done():
+                broadcast.task.cancel()  # everyone left before the stream ended
+                self._inflight.pop(key, None)
+
+
+class CoalescedLLM(LLM):
+    """Coalesces both methods of an async `LLM`, usable as `Node.llm`."""
+
+    def __init__(self, llm: LLM):
+        self.llm = llm
+        self.complete = CoalescedComplete(llm.complete)  # type: ignore
+        self.generate = CoalescedGenerate(llm.generate)  # type: ignore
@@ -0,0 +1,145 @@
+import ast
+from typing import NamedTuple
+
+
+class Dependencies(NamedTuple):
+    reads: frozenset[str]
+    """free names the template reads from its context"""
+    writes: frozenset[str]
+    """names the template binds itself, through `{# #}` blocks, `{{ }}` statements or `{% for %}` targets"""
+    components: frozenset[str]
+    """names used as components through `{% component %}` tags"""
+    calls: frozenset[str] = frozenset()
+    """free names the template calls, like `f` in `{{ f(x) }}`"""
+    opaque_calls: bool = False
+    """whether it imports modules or calls something other than a free name or its own functions, like `x.strip()`"""
+
+
+class NameCollector(ast.NodeVisitor):
+    """Collect the names mentioned in user-written code, and the ones it binds in its own scope."""
+
+    def __init__(self):
+        self.mentioned: set[str] = set()
+        self.bound: set[str] = set()
+        self.defined: set[str] = set()
+        """the functions and classes among `bound`"""
+        self.calls: set[str] = set()
+        """names called directly, like `f` in `f(x)`"""
+        self.opaque_calls = False
+
+    def visit_Name(self, node: ast.Name):
+        self.mentioned.add(node.id)
+        if not isinstance(node.ctx, ast.Load):
+            self.bound.add(node.id)
+
+    def _visit_nested_scope(self, node: ast.AST, name: str | None = None):
+        if name is not None:
+            self.bound.add(name)
+            self.defined.add(name)
+        nested = NameCollector()
+        nested.generic_visit(node)
+        self.mentioned |= nested.mentioned  # bindings inside a nested scope don't leak out
+        self.calls |= nested.calls - nested.bound
+        self.opaque_calls |= nested.has_opaque_calls
+
+    @property
+    def has_opaque_calls(self):
+        """calls whose callee static analysis can't tell, including ones to names bound to arbitrary values"""
+        return self.opaque_calls or not self.calls.isdisjoint(self.bound - self.defined)
+
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Name):
+            self.calls.add(node.func.id)
+        else:
+            self.opaque_calls = True
+        self.generic_visit(node)
+
+    def visit_Import(self, node: ast.Import | ast.ImportFrom):
+        self.opaque_calls = True  # `from random import random` would be called under any name
+        self.generic_visit(node)
+
+    visit_ImportFrom = visit_Import  # type: ignore
+
+    def visit_FunctionDef(self, node: ast.FunctionDef | ast.AsyncFunctionDef):
+        self._visit_nested_scope(node, node.name)
+
+    visit_AsyncFunctionDef = visit_FunctionDef  # type: ignore
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._visit_nested_scope(node, node.name)
+
+    def visit_Lambda(self, node: ast.AST):
+        self._visit_nested_scope(node)
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = visit_Lambda
+
+    def visit_alias(self, node: ast.alias):
+        self.bound.add(node.asname or node.name.split(".")[0])
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def collect(self, source: str):
+        self.visit(ast.parse(source))
+
+    def collect_arguments(self, source: str):
+        """collect from the arguments of a call, like the ones passed to a component"""
+        call = ast.parse(f"_({source})", mode="eval").body
+        assert isinstance(call, ast.Call)
+        for node in (*call.args, *call.keywords):
+            self.visit(node)
+
+
+class NameRenamer(ast.NodeTransformer):
+    """Consistently rename every binding and reference of the given names, including inside nested scopes."""
+
+    def __init__(self, names: dict[str, str]):
+        self.names = names
+
+    def _rename(self, name: str | None):
+        return None if name is None else self.names.get(name, name)
+
+    def visit_Name(self, node: ast.Name):
+        node.id = self.names.get(node.id, node.id)
+        return node
+
+    def visit_arg(self, node: ast.arg):
+        node.arg = self.names.get(node.arg, node.arg)
+        return self.generic_visit(node)
+
+    def _visit_named(self, node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef | ast.ExceptHandler):
+        node.name = self._rename(node.name)  # type: ignore
+        return self.generic_visit(node)
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_ExceptHandler = _visit_named  # type: ignore
+
+    def visit_Global(self, node: ast.Global | ast.Nonlocal):
+        node.names = [self.names.get(name, name) for name in node.names]
+        return node
+
+    visit_Nonlocal = visit_Global  # type: ignore
+
+    def visit_alias(self, node: ast.alias):
+        bound = node.asname or node.name
+        if bound in self.names:
+            if "." in bound:  # `import a.b` binds `a`, which can't be renamed with `as`
+                raise SyntaxError(f"can't rename dotted import {bound!r}")
+            node.asname = self.names[bound]
+        elif node.asname is None and node.name.split(".")[0] in self.names:
+            raise SyntaxError(f"can't rename dotted import {node.name!r}")
+        return node
+
+    def visit_MatchAs(self, node: ast.MatchAs | ast.MatchStar):
+        node.name = self._rename(node.name)
+        return self.generic_visit(node)
+
+    visit_MatchStar = visit_MatchAs  # type: ignore
+
+    def visit_MatchMapping(self, node: ast.MatchMapping):
+        node.rest = self._rename(node.rest)
+        return self.generic_visit(node)
+
+    def rename(self, source: str):
+        return ast.unparse(self.visit(ast.parse(source)))
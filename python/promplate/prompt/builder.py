@@ -1,4 +1,10 @@
+import ast
+import operator
+from re import compile
 from types import FunctionType
+from typing import Any
+
+__all__ = ("CodeBuilder", "get_base_builder")
 
 
 class CodeBuilder:
@@ -46,11 +52,82 @@ class CodeBuilder:
         return global_namespace["render"]
 
 
-def get_base_builder(sync=True, indent_str="\t"):
-    return (
-        CodeBuilder(indent_str=indent_str)
-        .add_line("def render():" if sync else "async def render():")
-        .indent()
-        .add_line("__parts__ = []")
-        .add_line("__append__ = __parts__.append")
-    )
+def get_base_builder(sync=True, indent_str="\t", stream=False):
+    builder = CodeBuilder(indent_str=indent_str).add_line("def render():" if sync else "async def render():").indent()
+
+    if stream:
+        return builder
+
+    return builder.add_line("__parts__ = []").add_line("__append__ = __parts__.append")
+
+
+_STR_METHODS = frozenset(
+    (
+        "capitalize casefold center expandtabs format format_map join ljust lower lstrip removeprefix "
+        "removesuffix replace rjust rstrip strip swapcase title translate upper zfill"
+    ).split()
+)
+
+
+starts_like_constant = compile(r"""[\d'"(.+\-~]|[rbfuRBFU]{1,2}['"]|(?:not|None|True|False)\b""").match
+"""whether an expression may be folded or known to be a `str`, anything else isn't worth parsing at compile time"""
+
+
+def is_known_str(node: ast.expr) -> bool:
+    """whether an expression always evaluates to a `str`, so the `str()` call around it can be skipped"""
+    match node:
+        case ast.Constant(value=str()) | ast.JoinedStr():
+            return True
+        case ast.BinOp(op=ast.Add(), left=left, right=right):
+            return is_known_str(left) and is_known_str(right)
+        case ast.Call(func=ast.Attribute(value=value, attr=attr)):
+            return attr in _STR_METHODS and is_known_str(value)
+    return False
+
+
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Invert: operator.invert, ast.Not: operator.not_}
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.LShift: operator.lshift,
+    ast.RShift: operator.rshift,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+    ast.BitAnd: operator.and_,
+}
+_FOLD_LIMIT = 4096
+
+
+class _NotConstant(Exception):
+    pass
+
+
+def _fold(node: ast.expr):
+    match node:
+        case ast.Constant(value=value):
+            return value
+        case ast.UnaryOp(op=op, operand=operand) if type(op) in _UNARY_OPS:
+            return _UNARY_OPS[type(op)](_fold(operand))
+        case ast.BinOp(left=left, op=op, right=right) if type(op) in _BINARY_OPS:
+            lhs, rhs = _fold(left), _fold(right)
+            if isinstance(op, ast.Pow | ast.LShift) and (not isinstance(rhs, int | float) or abs(rhs) > 64):
+                raise _NotConstant
+            if isinstance(op, ast.Mult):
+                for seq, n in ((lhs, rhs), (rhs, lhs)):
+                    if isinstance(seq, str | bytes | tuple) and isinstance(n, int) and len(seq) * n > _FOLD_LIMIT:
+                        raise _NotConstant
+            return _BINARY_OPS[type(op)](lhs, rhs)
+    raise _NotConstant
+
+
+def fold_constant(node: ast.expr) -> tuple[bool, Any]:
+    """try evaluating an expression made of constants and operators at compile time"""
+    try:
+        return True, _fold(node)
+    except Exception:  # anything raised here will be raised again at render time, so leave it to runtime
+        return False, None
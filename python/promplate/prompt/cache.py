@@ -0,0 +1,249 @@
+import builtins
+from collections import OrderedDict
+from functools import partial
+from hashlib import sha256
+from marshal import dumps, loads
+from os import getpid, replace
+from pathlib import Path
+from sys import implementation
+from sys import version as py_version
+from threading import RLock, get_ident
+from time import monotonic
+from types import CodeType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    Iterable,
+    Mapping,
+    NamedTuple,
+    TypeVar,
+)
+
+from .utils import version
+
+if TYPE_CHECKING:
+    from .template import Context, TemplateCore
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int | None
+    currsize: int
+
+
+class LRUCache(Generic[K, V]):
+    """A thread-safe, size-bounded mapping that evicts the least recently used entries, and optionally expired ones."""
+
+    def __init__(self, maxsize: int | None = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        self._data: OrderedDict[K, tuple[V, float | None]] = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def lookup(self, key: K) -> V:
+        """Return the cached value and count a hit, or raise `KeyError` and count a miss."""
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            if expires_at is not None and expires_at <= monotonic():
+                del self._data[key]
+                self.misses += 1
+                self.evictions += 1
+                raise KeyError(key)
+            self.hits += 1
+            self._data.move_to_end(key)
+            return value
+
+    def get(self, key: K, factory: Callable[[], V]) -> V:
+        try:
+            return self.lookup(key)
+        except KeyError:
+            pass
+        value = factory()  # computed outside the lock, so a slow factory never blocks other keys
+        self.set(key, value)
+        return value
+
+    def set(self, key: K, value: V):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value, None if self.ttl is None else monotonic() + self.ttl
+            self._data.move_to_end(key)
+            self._evict()
+
+    def discard(self, key: K):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize: int | None):
+        with self._lock:
+            self.maxsize = maxsize
+            if maxsize == 0:
+                self.evictions += len(self._data)
+                self._data.clear()
+            else:
+                self._evict()
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._data))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = RLock()
+
+
+class BytecodeCache:
+    """Persist compiled render code as marshalled files, like `__pycache__` for templates."""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory).expanduser()
+
+    @staticmethod
+    def make_key(*parts: object):
+        return sha256(repr((version("promplate"), implementation.cache_tag, py_version, *parts)).encode()).hexdigest()
+
+    def _path(self, key: str):
+        return self.directory / f"{key}.marshal"
+
+    def load(self, key: str) -> CodeType | None:
+        try:
+            code = loads(self._path(key).read_bytes())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return code if isinstance(code, CodeType) else None
+
+    def dump(self, key: str, code: CodeType):
+        path = self._path(key)
+        temp = path.with_name(f"{path.name}.{getpid()}.{get_ident()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            temp.write_bytes(dumps(code))
+            replace(temp, path)  # atomic, so concurrent workers never read a partial file
+        except OSError:
+            temp.unlink(missing_ok=True)
+
+    def get(self, key: str, factory: Callable[[], CodeType]):
+        code = self.load(key)
+        if code is None:
+            code = factory()
+            self.dump(key, code)
+        return code
+
+
+def _freeze(value):
+    match value:
+        case None | str() | int() | float() | complex() | bytes():
+            return type(value), value  # `1`, `1.0` and `True` are equal but render differently
+        case list() | tuple():
+            return type(value), tuple(map(_freeze, value))
+        case set() | frozenset():
+            return type(value), frozenset(map(_freeze, value))
+        case dict():
+            return type(value), tuple((_freeze(k), _freeze(v)) for k, v in value.items())
+    raise TypeError(value)  # including functions, classes and modules, which may return anything each time
+
+
+class RenderCache(LRUCache[Hashable, str]):
+    """Memoise rendered strings, keyed only on the context values a template depends on."""
+
+    def __init__(self, maxsize: int | None = 1024, ttl: float | None = None, pure: Iterable[Any] = ()):
+        """only templates whose calls all go to `pure` functions or classes are cached, like `pure=[len, str.upper]`
+
+        Anything else may return something new each time, and importing or calling methods always bypasses the cache.
+        """
+
+        super().__init__(maxsize, ttl)
+        self.bypasses = 0
+        self.pure = {id(value): value for value in pure}
+
+    def _is_pure(self, value):
+        return self.pure.get(id(value)) is value
+
+    def _freeze(self, value):
+        if self._is_pure(value):
+            return value
+        return _freeze(value)
+
+    def make_key(self, template: "TemplateCore", context: Mapping[str, Any]):
+        """return `None` if the render result may not be reused"""
+        dependencies = template.dependencies
+        if dependencies.components or dependencies.opaque_calls:
+            return None
+        if (names := template._render_names) is None or names.stores:  # writes to the context need the render to happen
+            return None
+        for name in dependencies.calls:
+            if not self._is_pure(context[name] if name in context else getattr(builtins, name, None)):
+                return None
+
+        values = []
+        for name in sorted(dependencies.reads):
+            try:
+                values.append(self._freeze(context[name]))
+            except KeyError:
+                values.append(None)
+            except TypeError:
+                return None
+
+        return template.text, *values
+
+    def render(self, template: "TemplateCore", context: "Context", render: Callable[["Context"], str]):
+        if (key := self.make_key(template, context)) is None:
+            self.bypasses += 1
+            return render(context)
+        return self.get(key, partial(render, context))
+
+    async def arender(self, template: "TemplateCore", context: "Context", arender: Callable[["Context"], Awaitable[str]]):
+        if (key := self.make_key(template, context)) is None:
+            self.bypasses += 1
+            return await arender(context)
+        try:
+            return self.lookup(key)
+        except KeyError:
+            pass
+        result = await arender(context)
+        self.set(key, result)
+        return result
+
+    def clear(self):
+        super().clear()
+        self.bypasses = 0
+
+
+code_cache: LRUCache[Hashable, CodeType] = LRUCache(1024)  # shared by every `TemplateCore` in the process
@@ -0,0 +1,139 @@
+"""A single-pass lexer for `{{ }}`, `{# #}` and `{% %}` tags, tracking where every token is.
+
+It splits templates exactly like `split_template_tokens`, including the `-` variants,
+which also eat one whitespace character next to them.
+"""
+
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+from re import compile
+from typing import Iterator, Literal, NamedTuple
+
+Kind = Literal["literal", "eval", "exec", "special"]
+
+_find_opening = compile(r"{[{%#]").search
+_closings = {"{": "}}", "%": "%}", "#": "#}"}
+_kinds: dict[str, Kind] = {"{": "eval", "%": "special", "#": "exec"}
+
+
+class Token(NamedTuple):
+    kind: Kind
+    text: str
+    """the raw token, including its delimiters and the whitespace eaten by `-`"""
+    start: int
+    end: int
+
+
+_start = attrgetter("start")
+
+
+def _find_closing(text: str, start: int, closing: str, single_line: bool):
+    """end of the shortest tag body starting at `start`, or -1"""
+
+    index = text.find(closing, start)
+    if index == -1 or single_line and -1 != text.find("\n", start, index):
+        return -1
+    if index > start and text[index - 1] == "-" and text[index + 2 : index + 3].isspace():
+        return index + 3
+    return index + 2
+
+
+def _lex(text: str, pos: int, unclosed: list[int]) -> Iterator[Token]:
+    """yield tokens from `pos`, recording where `{{` and `{#` never get closed"""
+
+    literal_start = search_start = pos
+
+    while match := _find_opening(text, search_start):
+        index = match.start()
+        mark = text[index + 1]
+        closing, single_line = _closings[mark], mark == "%"
+
+        end = -1
+        if index > literal_start and text[index - 1].isspace() and text.startswith("-", index + 2):
+            start = index - 1
+            end = _find_closing(text, index + 3, closing, single_line)
+        if end == -1:
+            start = index
+            end = _find_closing(text, index + 2, closing, single_line)
+        if end == -1:
+            if not single_line:
+                unclosed.append(index)
+            search_start = index + 1
+            continue
+
+        if start > literal_start:
+            yield Token("literal", text[literal_start:start], literal_start, start)
+        yield Token(_kinds[mark], text[start:end], start, end)
+        literal_start = search_start = end
+
+    if literal_start < len(text):
+        yield Token("literal", text[literal_start:], literal_start, len(text))
+
+
+def tokenize(text: str) -> list[Token]:
+    return list(_lex(text, 0, []))
+
+
+class Lexer:
+    """Keep the tokens of a template up to date while it is being edited, re-lexing only around the changes."""
+
+    def __init__(self, text=""):
+        self.text = text
+        self._unclosed: list[int] = []
+        self.tokens = list(_lex(text, 0, self._unclosed))
+
+    def _restart_position(self, start: int):
+        """a token boundary before `start` which lexing the new text can safely resume from"""
+
+        # a `{% %}` tag can't span lines, and `-` may eat the line break right before the changed line
+        position = self.text.rfind("\n", 0, start)
+        if self._unclosed and self._unclosed[0] < start:
+            position = min(position, self._unclosed[0])  # the edit may close it
+        if position < 0:
+            return 0
+        index = bisect_right(self.tokens, position, key=_start) - 1
+        if index and self.tokens[index - 1].kind == "literal":
+            index -= 1  # the tag may turn into text, which has to merge into the literal before it
+        return self.tokens[index].start
+
+    def edit(self, start: int, end: int, replacement: str):
+        """replace `text[start:end]`, return the number of tokens that were re-lexed"""
+
+        text = self.text[:start] + replacement + self.text[end:]
+        delta = len(replacement) - (end - start)
+        restart = self._restart_position(start)
+        new_end = start + len(replacement)
+
+        tokens = self.tokens
+        new = tuple.__new__  # skips `Token.__new__`, as the tail can be long
+        head = tokens[: bisect_left(tokens, restart, key=_start)]
+        unclosed = [position for position in self._unclosed if position < restart]
+
+        relexed: list[Token] = []
+        tail: list[Token] = []
+        for token in _lex(text, restart, unclosed):
+            relexed.append(token)
+            if token.end < new_end:
+                continue
+            resumed = token.end - delta  # where the same boundary was in the old text
+            index = bisect_left(tokens, resumed, key=_start)
+            if index < len(tokens) and tokens[index].start == resumed:
+                tail = (
+                    tokens[index:] if not delta else [new(Token, (k, t, s + delta, e + delta)) for k, t, s, e in tokens[index:]]
+                )
+                unclosed.extend(position + delta for position in self._unclosed if position >= resumed)
+                break
+
+        self.text = text
+        self.tokens = head + relexed + tail
+        self._unclosed = unclosed
+        return len(relexed)
+
+    def locate(self, offset: int):
+        """1-based line and column of a position in the text"""
+        return locate(self.text, offset)
+
+
+def locate(text: str, offset: int):
+    """1-based line and column of a position in `text`"""
+    return text.count("\n", 0, offset) + 1, offset - (text.rfind("\n", 0, offset) + 1) + 1
@@ -0,0 +1,113 @@
+"""Build step that turns a directory of templates into a package of importable render functions.
+
+Importing the generated modules goes through python's own `__pycache__`,
+so registering them seeds `code_cache` without tokenising or `exec`-ing anything at startup.
+"""
+
+from importlib import import_module
+from pathlib import Path
+from py_compile import PycInvalidationMode
+from py_compile import compile as compile_file
+from types import FunctionType, ModuleType
+
+from .cache import code_cache
+from .template import Template, TemplateCore
+
+FORMAT = 2
+"""bump whenever the generated code changes shape, so stale packages are ignored instead of misbehaving"""
+
+_variants = (
+    ("render", True, False),
+    ("arender", False, False),
+    ("render_iter", True, True),
+    ("arender_iter", False, True),
+)
+
+
+def generate_functions(template: TemplateCore, suffix: str):
+    """python source defining `render`, `arender`, `render_iter` and `arender_iter` for one template"""
+    assert not template.inline_components, "inlined components are resolved per instance, so they can't be precompiled"
+
+    return "\n\n".join(
+        template.get_script(sync, "    ", stream).replace("def render():", f"def {name}{suffix}():", 1)
+        for name, sync, stream in _variants
+    )
+
+
+def precompile(
+    source: str | Path,
+    target: str | Path,
+    pattern="**/*",
+    template_class: type[TemplateCore] = Template,
+):
+    """compile every template under `source` into a package at `target`, returns how many templates were compiled
+
+    Everything goes into a single `__init__.py`, so loading it costs one `.pyc` read however many templates there are.
+    """
+
+    source, target = Path(source), Path(target)
+
+    sections = [
+        '"""templates precompiled by promplate, regenerate instead of editing"""',
+        f"FORMAT = {FORMAT}",
+    ]
+    entries: list[str] = []
+
+    for index, path in enumerate(path for path in sorted(source.glob(pattern)) if path.is_file()):
+        template = template_class(path.read_text("utf-8"))
+        relative = path.relative_to(source).as_posix()
+        sections.append(f"# {relative}\n\n{generate_functions(template, f'_{index}')}")
+        functions = ", ".join(f"{name}_{index}" for name, *_ in _variants)
+        entries.append(f"    {relative!r}: ({template.text!r}, ({functions})),\n")
+
+    sections.append(f"TEMPLATES = {{\n{''.join(entries)}}}")
+
+    target.mkdir(parents=True, exist_ok=True)
+    (init := target / "__init__.py").write_text("\n\n\n".join(sections) + "\n", "utf-8")
+    # write the `.pyc` at build time, so read-only deployments and `PYTHONDONTWRITEBYTECODE` still skip compiling
+    compile_file(str(init), doraise=True, invalidation_mode=PycInvalidationMode.CHECKED_HASH)
+
+    return len(entries)
+
+
+def load_precompiled(package: str | ModuleType, template_class: type[TemplateCore] = Template):
+    """seed `code_cache` from a package generated by `precompile`, returns how many templates were registered
+
+    After this, `Template.read("x.j2")` (or any template with the same text) reuses the precompiled code.
+    """
+
+    if isinstance(package, str):
+        package = import_module(package)
+
+    if getattr(package, "FORMAT", None) != FORMAT:
+        return 0  # the codegen may have changed, let these templates compile as usual
+
+    templates: dict[str, tuple[str, tuple[FunctionType, ...]]] = package.TEMPLATES
+
+    needed = len(code_cache) + len(_variants) * len(templates)
+    if code_cache.maxsize is not None and code_cache.maxsize < needed:
+        code_cache.resize(needed)  # registering should never evict what it just registered
+
+    for text, functions in templates.values():
+        for (_, sync, stream), function in zip(_variants, functions):
+            code = function.__code__.replace(co_firstlineno=1)  # line numbers as in `get_script`, for tracebacks
+            code_cache.set((template_class, text, sync, stream), code)
+
+    return len(templates)
+
+
+def main(argv: list[str] | None = None):
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser("python -m promplate.prompt.precompile", description="precompile templates into a python package")
+    parser.add_argument("source", help="directory containing the template files")
+    parser.add_argument("target", help="directory of the package to generate")
+    parser.add_argument("--pattern", default="**/*", help="glob of template files, relative to source")
+    args = parser.parse_args(argv)
+
+    count = precompile(args.source, args.target, args.pattern)
+    print(f"precompiled {count} templates into {args.target}")
+
+
+if __name__ == "__main__":
+    main()
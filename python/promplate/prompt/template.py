@@ -1,14 +1,32 @@
-from ast import Expr, parse, unparse
+from ast import Call, Expr, For, expr, parse, unparse
+from asyncio import gather
 from collections import ChainMap
+from concurrent.futures import Executor
 from functools import cached_property, partial
+from itertools import count
 from pathlib import Path
-from sys import path as sys_path
 from sys import version_info
 from textwrap import dedent
-from typing import TYPE_CHECKING, Any, Literal, Protocol
-
+from threading import RLock
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Iterable,
+    Iterator,
+    Literal,
+    Mapping,
+    Protocol,
+)
+
+from .analysis import Dependencies, NameCollector, NameRenamer
 from .builder import *
+from .builder import fold_constant, is_known_str, starts_like_constant
+from .cache import BytecodeCache, RenderCache, code_cache
+from .lexer import locate, tokenize
+from .tracebacks import source_registry
 from .utils import *
+from .utils import _dynamic_scope_names
 
 Context = dict[str, Any]  # globals must be a real dict
 
@@ -19,6 +37,37 @@ class Component(Protocol):
     async def arender(self, context: Context) -> str: ...
 
 
+_code_attributes = {
+    (True, False): "_render_code",
+    (False, False): "_arender_code",
+    (True, True): "_render_iter_code",
+    (False, True): "_arender_iter_code",
+}
+
+_control_ops = frozenset(("if", "elif", "else", "for", "while"))
+_inline_prefix = "__inline"
+
+
+class _NotInlinable(Exception):
+    pass
+
+
+def _wrap_block(kind: str, code: str):
+    return f"{{{{\n{code}\n}}}}" if kind == "eval" else f"{{#\n{code}\n#}}"
+
+
+def _rename_special(inner: str, renamer: NameRenamer):
+    op, _, rest = inner.partition(" ")
+    if op == "for":
+        node = parse(f"{inner}: pass").body[0]
+        assert isinstance(node, For)
+        node = renamer.visit(node)
+        return f"for {unparse(node.target)} in {unparse(node.iter)}"
+    if op == "if" or op == "elif" or op == "while":
+        return f"{op} {unparse(renamer.visit(parse(rest, mode='eval')))}"
+    return inner
+
+
 class TemplateCore(AutoNaming):
     """A simple template compiler, for a jinja2-like syntax."""
 
@@ -27,17 +76,65 @@ class TemplateCore(AutoNaming):
 
         self.text = text
 
+    def _add_line(self, line: str, start: int | None):
+        self._builder.add_line(line)
+        self._line_starts.append(start)
+
     def _flush(self):
-        for line in self._buffer:
-            self._builder.add_line(line)
+        self._flush_literals()
+        if self._buffer:
+            self._block_empty = False
+        for line, start in self._buffer:
+            self._add_line(line, start)
         self._buffer.clear()
 
+    def _open_block(self, header: str):
+        self._flush()
+        self._add_line(f"{header}:", self._start)
+        self._builder.indent()
+        self._block_empty = True
+
+    def _close_block(self):
+        self._flush()
+        if self._block_empty:  # like `{% if x %}{% endif %}`
+            self._add_line("pass", self._start)
+        self._builder.dedent()
+
+    def _flush_literals(self):
+        """coalesce the pending literals into a single append"""
+        if self._literals:
+            text = "".join(self._literals)
+            self._literals.clear()
+            self._buffer.append((f"yield {text!r}" if self._stream else f"__append__({text!r})", None))
+
     @staticmethod
     def _unwrap_token(token: str):
-        return dedent(token.strip()[2:-2].strip("-")).strip()
+        inner = token.strip()[2:-2].strip("-")
+        return dedent(inner).strip() if "\n" in inner else inner.strip()  # dedenting a single line changes nothing
+
+    def _emit(self, exp: str, node: expr | None = None):
+        if node is None and starts_like_constant(exp):
+            try:
+                node = parse(exp, mode="eval").body
+            except SyntaxError:
+                pass  # raised again with its position when the whole script is compiled
+
+        if node is not None:
+            foldable, value = fold_constant(node)
+            if foldable:  # like `{{ "=" * 20 }}`, merged into the surrounding literals
+                self._literals.append(str(value))
+                return
+
+        self._flush_literals()
+        known_str = node is not None and is_known_str(node)
+        self._all_str &= known_str
+        if not self._stream:
+            self._buffer.append((f"__append__({exp})", self._start))
+        else:
+            self._buffer.append((f"yield {exp}" if known_str else f"yield str({exp})", self._start))
 
     def _on_literal_token(self, token: str):
-        self._buffer.append(f"__append__({repr(token)})")
+        self._literals.append(token)
 
     def _on_eval_token(self, token):
         token = self._unwrap_token(token)
@@ -45,45 +142,41 @@ class TemplateCore(AutoNaming):
             mod = parse(token)
             [*rest, last] = mod.body
             assert isinstance(last, Expr), "{{ }} block must end with an expression, or you should use {# #} block"
-            self._buffer.extend(unparse(rest).splitlines())  # type: ignore
-            exp = unparse(last)
+            self._flush_literals()
+            self._buffer.extend((line, self._start) for line in unparse(rest).splitlines())  # type: ignore
+            self._emit(unparse(last), last.value)
         else:
-            exp = token
-        self._buffer.append(f"__append__({exp})")
+            self._emit(token)
 
     def _on_exec_token(self, token):
-        self._buffer.extend(self._unwrap_token(token).splitlines())
+        self._flush_literals()
+        self._buffer.extend((line, self._start) for line in self._unwrap_token(token).splitlines())
 
     def _on_special_token(self, token, sync: bool):
         inner = self._unwrap_token(token)
 
         if inner.startswith("end"):
-            last = self._ops_stack.pop()
+            last, _ = self._ops_stack.pop()
             assert last == inner.removeprefix("end")
-            self._flush()
-            self._builder.dedent()
+            self._close_block()
 
         else:
             op = inner.split(" ", 1)[0]
 
             if op == "if" or op == "for" or op == "while":
-                self._ops_stack.append(op)
-                self._flush()
-                self._builder.add_line(f"{inner}:")
-                self._builder.indent()
+                self._ops_stack.append((op, self._start))
+                self._open_block(inner)
 
             elif op == "else" or op == "elif":
-                self._flush()
-                self._builder.dedent()
-                self._builder.add_line(f"{inner}:")
-                self._builder.indent()
+                self._close_block()
+                self._open_block(inner)
 
             else:
                 params: str = self._make_context(inner)
                 if sync:
-                    self._buffer.append(f"__append__({op}.render({params}))")
+                    self._emit(f"{op}.render({params})")
                 else:
-                    self._buffer.append(f"__append__(await {op}.arender({params}))")
+                    self._emit(f"await {op}.arender({params})")
 
     @staticmethod
     def _make_context(text: str):
@@ -92,69 +185,345 @@ class TemplateCore(AutoNaming):
             return f"globals() | locals() | dict({text[text.index(' ') + 1:]})" if " " in text else "globals() | locals()"
         return f"locals() | dict({text[text.index(' ') + 1:]})" if " " in text else "locals()"
 
-    def compile(self, sync=True, indent_str="\t"):
-        self._buffer = []
-        self._ops_stack = []
-        self._builder = get_base_builder(sync, indent_str)
+    @staticmethod
+    def _classify_tokens(text: str):
+        for token in tokenize(text):
+            yield token.kind, token.text, token.start
+
+    def _syntax_error(self, message: str, start: int | None, cls: type[SyntaxError] = SyntaxError):
+        """a syntax error pointing at the tag starting at `start`, which is `None` for the tags of inlined components"""
+        if start is None:
+            return cls(message)
+        line, column = locate(self.text, start)
+        return cls(message, (self.name, line, column, self.text[start - column + 1 :].partition("\n")[0]))
+
+    def _iter_tokens(self):
+        if not self.inline_components:
+            return self._classify_tokens(self.text)
+        return self._expand_tokens({}, (self,), count())
+
+    inline_components = False
+    """splice the code of components known at compile time into this template, instead of calling them at runtime"""
+
+    def _static_components(self) -> Mapping[str, Any]:
+        """the bindings components are resolved from when inlining"""
+        return {}
 
-        for token in split_template_tokens(self.text):
-            if not token:
+    def _collect_names(self, tokens: Iterable[tuple[str, str, int | None]]):
+        """names mentioned and bound by user-written code, excluding component names, and the components used"""
+
+        collector = NameCollector()
+        components: set[str] = set()
+
+        for kind, token, _ in tokens:
+            if kind == "literal":
+                continue
+            inner = self._unwrap_token(token)
+            if kind != "special":
+                collector.collect(inner)
                 continue
-            s_token = token.strip()
-            if s_token.startswith("{{") and s_token.endswith("}}"):
-                self._on_eval_token(token)
-            elif s_token.startswith("{#") and s_token.endswith("#}"):
-                self._on_exec_token(token)
-            elif s_token.startswith("{%") and s_token.endswith("%}") and "\n" not in s_token:
-                self._on_special_token(token, sync)
+
+            op, _, rest = inner.partition(" ")
+            if op == "if" or op == "elif" or op == "while":
+                collector.collect(rest)
+            elif op == "for":
+                collector.collect(f"{inner}: pass")
+            elif op != "else" and not op.startswith("end"):
+                components.add(op)
+                if rest:
+                    collector.collect_arguments(rest)
+
+        return collector, components
+
+    def _expand_tokens(self, renames: dict[str, str], stack: tuple["TemplateCore", ...], counter: Iterator[int]):
+        for kind, token, start in self._classify_tokens(self.text):
+            if len(stack) > 1:
+                start = None  # a position in the component, not in the template being compiled
+            if kind == "literal":
+                yield kind, token, start
+                continue
+
+            inner = self._unwrap_token(token)
+
+            if kind == "special":
+                op, _, rest = inner.partition(" ")
+                if op not in _control_ops and not op.startswith("end"):
+                    if (inlined := self._inline_component(op, rest, renames, stack, counter)) is not None:
+                        yield from inlined
+                        continue
+                    if renames:  # a runtime call would only see the renamed locals
+                        raise _NotInlinable(op)
+
+            if not renames:
+                yield kind, token, start
+            elif kind == "special":
+                yield kind, f"{{% {_rename_special(inner, NameRenamer(renames))} %}}", start
             else:
-                self._on_literal_token(token)
+                code = NameRenamer(renames).rename(inner)
+                yield kind, f"{{{{ {code} }}}}" if kind == "eval" and "\n" not in code else _wrap_block(kind, code), start
+
+    def _inline_component(
+        self, op: str, rest: str, renames: dict[str, str], stack: tuple["TemplateCore", ...], counter: Iterator[int]
+    ):
+        child = self._static_components().get(op)
+        if not isinstance(child, TemplateCore) or type(child) is not type(self) or child in stack:
+            return None
+
+        try:
+            call = parse(f"_({rest})", mode="eval").body
+            assert isinstance(call, Call)
+            if call.args or any(keyword.arg is None for keyword in call.keywords):
+                return None
+
+            collector, _ = child._collect_names(child._classify_tokens(child.text))
+            own_components = child._static_components()
+            if not collector.mentioned.isdisjoint(own_components) or not collector.mentioned.isdisjoint(_dynamic_scope_names):
+                return None
+            if any(not isinstance(component, TemplateCore) for component in own_components.values()):
+                return None
+
+            prefix = f"{_inline_prefix}{next(counter)}_"
+            arguments = {keyword.arg: keyword.value for keyword in call.keywords}
+            child_renames = renames | {name: f"{prefix}{name}" for name in collector.bound | arguments.keys()}
+
+            tokens: list[tuple[str, str, int | None]] = []
+            if arguments:
+                renamer = NameRenamer(renames)  # arguments are evaluated in the caller's scope
+                code = "\n".join(f"{child_renames[name]} = {unparse(renamer.visit(value))}" for name, value in arguments.items())
+                tokens.append(("exec", _wrap_block("exec", code), None))
+            tokens.extend(child._expand_tokens(child_renames, (*stack, child), counter))
+            return tokens
+
+        except (SyntaxError, _NotInlinable):
+            return None
+
+    def _inline_key(self, stack: tuple["TemplateCore", ...] = ()) -> tuple:
+        """everything the inlined code depends on besides `self.text`"""
+        return tuple(
+            (
+                (name, type(component), component.text, component._inline_key((*stack, self)))
+                if isinstance(component, TemplateCore) and component not in stack
+                else (name, type(component))  # never inlined, but the name decides whether the template using it can be
+            )
+            for name, component in sorted(self._static_components().items())
+        )
+
+    def compile(self, sync=True, indent_str="\t", stream=False):
+        self._buffer = []
+        self._literals = []
+        self._all_str = True  # whether every part is known to be a `str`, so joining them needs no `map(str, ...)`
+        self._ops_stack: list[tuple[str, int | None]] = []
+        self._block_empty = False
+        self._stream = stream
+        self._builder = get_base_builder(sync, indent_str, stream)
+        self._line_starts: list[int | None] = [None] * str(self._builder).count("\n")
+        """where in the template every generated line comes from, to point syntax errors at it"""
+
+        for kind, token, self._start in self._iter_tokens():
+            try:
+                if kind == "eval":
+                    self._on_eval_token(token)
+                elif kind == "exec":
+                    self._on_exec_token(token)
+                elif kind == "special":
+                    self._on_special_token(token, sync)
+                else:
+                    self._on_literal_token(token)
+            except SyntaxError as e:
+                raise self._syntax_error(e.msg, self._start, e.__class__) from e
 
         if self._ops_stack:
-            raise SyntaxError(self._ops_stack)
+            op, start = self._ops_stack[-1]
+            raise self._syntax_error(f"'{op}' block is never closed", start)
 
+        self._start = None
         self._flush()
-        self._builder.add_line("return ''.join(map(str, __parts__))")
+        if stream:
+            self._add_line("return", None)
+            self._add_line("yield  # keeps this a generator even if nothing is emitted", None)
+        elif self._all_str:
+            self._add_line("return ''.join(__parts__)", None)
+        else:
+            self._add_line("return ''.join(map(str, __parts__))", None)
         self._builder.dedent()
 
     error_handling: Literal["linecache", "tempfile", "file"] = "file" if __debug__ else "tempfile"
 
-    def _patch_for_error_handling(self, sync: bool):
-        match self.error_handling:
-            case "linecache":
-                add_linecache(self.name, partial(self.get_script, sync, "\t"))
-            case "file" | "tempfile":
-                file = save_tempfile(self.name, self.get_script(sync, "\t"), self.error_handling == "tempfile")
-                sys_path.append(str(file.parent))
+    def _patch_for_error_handling(self, sync: bool, stream=False):
+        if self.error_handling in ("linecache", "tempfile", "file"):
+            code = getattr(self, _code_attributes[sync, stream])
+            source_registry.register(code, partial(self.get_script, sync, "\t", stream), self.error_handling)
+
+    bytecode_cache: BytecodeCache | None = None
+
+    def _code_key(self, sync: bool, stream: bool):
+        if self.inline_components:
+            return self.__class__, self.text, sync, stream, self._inline_key()
+        return self.__class__, self.text, sync, stream
+
+    @property
+    def _compile_lock(self):
+        """`compile` keeps its state on the instance, so threads rendering a cold template take turns compiling it"""
+        return self.__dict__.setdefault("__compile_lock", RLock())  # atomic, so every thread gets the same lock
+
+    def _compile_code(self, sync: bool, stream: bool):
+        with self._compile_lock:
+            self.compile(sync, stream=stream)
+            try:
+                return self._builder.get_render_function().__code__
+            except SyntaxError as e:
+                if not 0 < (e.lineno or 0) <= len(self._line_starts) or (start := self._line_starts[e.lineno - 1]) is None:
+                    raise
+                raise self._syntax_error(e.msg, start, e.__class__) from e
+
+    def _load_code(self, sync: bool, stream: bool):
+        if self.bytecode_cache is None:
+            return self._compile_code(sync, stream)
+
+        cls, *rest = self._code_key(sync, stream)
+        key = self.bytecode_cache.make_key(f"{cls.__module__}.{cls.__qualname__}", *rest)
+        return self.bytecode_cache.get(key, partial(self._compile_code, sync, stream))
+
+    def _get_code(self, sync: bool, stream=False):
+        return code_cache.get(self._code_key(sync, stream), partial(self._load_code, sync, stream))
+
+    flat_context = True
+
+    def _flatten(self, context: Context, names: GlobalNames | None) -> Context:
+        """resolve the names a template references into a real dict, so that global lookups run at dict speed"""
+        if names is None or not self.flat_context or type(context) is dict:
+            return context
+        return flatten_context(context, names.loads)
+
+    @staticmethod
+    def _write_back(context: Context, scope: Context, names: GlobalNames | None):
+        if scope is not context and names is not None and names.stores:
+            write_back_context(context, scope, names.stores)
 
     @cached_property
     def _render_code(self):
-        self.compile()
-        return self._builder.get_render_function().__code__.replace(co_filename=self.name, co_name="render")
+        return self._get_code(sync=True).replace(co_filename=self.name, co_name="render")
+
+    @cached_property
+    def _render_names(self):
+        return get_global_names(self._render_code)
 
     def render(self, context: Context) -> str:
+        scope = self._flatten(context, names := self._render_names)
         try:
-            return eval(self._render_code, context)
+            return eval(self._render_code, scope)
         except Exception:
             self._patch_for_error_handling(sync=True)
             raise
+        finally:
+            self._write_back(context, scope, names)
 
     @cached_property
     def _arender_code(self):
-        self.compile(sync=False)
-        return self._builder.get_render_function().__code__.replace(co_filename=self.name, co_name="arender")
+        return self._get_code(sync=False).replace(co_filename=self.name, co_name="arender")
+
+    @cached_property
+    def _arender_names(self):
+        return get_global_names(self._arender_code)
 
     async def arender(self, context: Context) -> str:
+        scope = self._flatten(context, names := self._arender_names)
         try:
-            return await eval(self._arender_code, context)
+            return await eval(self._arender_code, scope)
         except Exception:
             self._patch_for_error_handling(sync=False)
             raise
+        finally:
+            self._write_back(context, scope, names)
+
+    @cached_property
+    def _render_iter_code(self):
+        return self._get_code(sync=True, stream=True).replace(co_filename=self.name, co_name="render_iter")
+
+    @cached_property
+    def _render_iter_names(self):
+        return get_global_names(self._render_iter_code)
+
+    def render_iter(self, context: Context) -> Iterator[str]:
+        scope = self._flatten(context, names := self._render_iter_names)
+        try:
+            yield from eval(self._render_iter_code, scope)
+        except Exception:
+            self._patch_for_error_handling(sync=True, stream=True)
+            raise
+        finally:
+            self._write_back(context, scope, names)
 
-    def get_script(self, sync=True, indent_str="    "):
+    @cached_property
+    def _arender_iter_code(self):
+        return self._get_code(sync=False, stream=True).replace(co_filename=self.name, co_name="arender_iter")
+
+    @cached_property
+    def _arender_iter_names(self):
+        return get_global_names(self._arender_iter_code)
+
+    async def arender_iter(self, context: Context) -> AsyncIterator[str]:
+        scope = self._flatten(context, names := self._arender_iter_names)
+        try:
+            async for part in eval(self._arender_iter_code, scope):
+                yield part
+        except Exception:
+            self._patch_for_error_handling(sync=False, stream=True)
+            raise
+        finally:
+            self._write_back(context, scope, names)
+
+    @cached_property
+    def dependencies(self):
+        """names the template reads, binds, calls and uses as components, found by static analysis"""
+
+        collector, components = self._collect_names(self._iter_tokens())
+        collector.mentioned |= components
+
+        code = self._render_code
+        loads, stores = collect_global_names(code)
+        # names only referenced by the generated code, like `str` in the final join, are not dependencies
+        reads = loads & collector.mentioned
+        writes = {name for name in (set(code.co_varnames) | stores) & collector.bound if not name.startswith(_inline_prefix)}
+
+        calls = collector.calls - collector.bound
+        return Dependencies(
+            frozenset(reads), frozenset(writes), frozenset(components), frozenset(calls), collector.has_opaque_calls
+        )
+
+    _compiled_attributes = (
+        "_buffer",
+        "_literals",
+        "_all_str",
+        "_block_empty",
+        "_ops_stack",
+        "_start",
+        "_line_starts",
+        "_stream",
+        "_builder",
+        "_render_code",
+        "_render_names",
+        "_arender_code",
+        "_arender_names",
+        "_render_iter_code",
+        "_render_iter_names",
+        "_arender_iter_code",
+        "_arender_iter_names",
+    )
+
+    def __getstate__(self):
+        """drop compiled code objects, they are rebuilt (or loaded from `code_cache`) on first use after unpickling"""
+        state = self.__dict__.copy()
+        for attr in self._compiled_attributes:
+            state.pop(attr, None)
+        state.pop("__compile_lock", None)
+        return state
+
+    def get_script(self, sync=True, indent_str="    ", stream=False):
         """compile template string into python script"""
-        self.compile(sync, indent_str)
-        return str(self._builder)
+        with self._compile_lock:
+            self.compile(sync, indent_str, stream)
+            return str(self._builder)
 
 
 class Loader(AutoNaming):
@@ -226,18 +595,73 @@ class Template(TemplateCore, Loader):
         super().__init__(text)
         self.context = {} if context is None else context
 
-    def render(self, context: Context | None = None):
+    def _chain_context(self, context: Context | None):
         if context is None:
-            context = SafeChainMapContext({}, self.context)
-        else:
-            context = SafeChainMapContext({}, context, self.context)
+            return SafeChainMapContext({}, self.context)
+        return SafeChainMapContext({}, context, self.context)
 
-        return super().render(context)
+    def _static_components(self):
+        return self.context
+
+    render_cache: RenderCache | None = None
+
+    def render(self, context: Context | None = None):
+        if self.render_cache is None:
+            return super().render(self._chain_context(context))
+        return self.render_cache.render(self, self._chain_context(context), super().render)
 
     async def arender(self, context: Context | None = None):
+        if self.render_cache is None:
+            return await super().arender(self._chain_context(context))
+        return await self.render_cache.arender(self, self._chain_context(context), super().arender)
+
+    def _scaffold(self, names: GlobalNames | None):
+        """flatten the template's own context once, so that each row of a batch only resolves its own names"""
+        if names is None or not self.flat_context or self.render_cache is not None:
+            return None
+        return flatten_context(self.context, names.loads)
+
+    def _batch_scope(self, base: Context, context: Context | None, names: GlobalNames):
         if context is None:
-            context = SafeChainMapContext({}, self.context)
-        else:
-            context = SafeChainMapContext({}, context, self.context)
+            return base.copy()
+        return base | flatten_context(context, names.loads)
+
+    def render_many(self, contexts: Iterable[Context | None], executor: Executor | None = None, chunksize=1) -> list[str]:
+        """render every context with one compiled function, returning results in order
+
+        Pass a thread or process pool as `executor` to fan out very large batches.
+        """
+
+        if executor is not None:
+            return list(executor.map(self.render, contexts, chunksize=chunksize))
+
+        if (base := self._scaffold(names := self._render_names)) is None:
+            return [self.render(context) for context in contexts]
+
+        assert names is not None
+        code = self._render_code
+        try:
+            return [eval(code, self._batch_scope(base, context, names)) for context in contexts]
+        except Exception:
+            self._patch_for_error_handling(sync=True)
+            raise
+
+    async def arender_many(self, contexts: Iterable[Context | None]) -> list[str]:
+        """render every context concurrently with one compiled function, returning results in order"""
+
+        if (base := self._scaffold(names := self._arender_names)) is None:
+            return await gather(*map(self.arender, contexts))
+
+        assert names is not None
+        code = self._arender_code
+        try:
+            return await gather(*(eval(code, self._batch_scope(base, context, names)) for context in contexts))
+        except Exception:
+            self._patch_for_error_handling(sync=False)
+            raise
+
+    def render_iter(self, context: Context | None = None):
+        return super().render_iter(self._chain_context(context))
 
-        return await super().arender(context)
+    def arender_iter(self, context: Context | None = None):
+        return super().arender_iter(self._chain_context(context))
@@ -0,0 +1,86 @@
+"""Show the generated source of templates in tracebacks, paying for it at most once per code object.
+
+Sources are registered as `linecache` entries, so formatting a traceback never touches the filesystem.
+The `"file"` and `"tempfile"` modes additionally write each source once into a per-process directory,
+for debuggers which open files by themselves. Each mode has its own, so only the `"tempfile"` one is deleted at exit.
+"""
+
+import linecache
+from collections import OrderedDict
+from pathlib import Path
+from sys import path as sys_path
+from threading import RLock
+from types import CodeType
+from typing import Callable, Literal
+
+
+class SourceRegistry:
+    def __init__(self, maxsize: int | None = 256):
+        self.maxsize = maxsize
+        self._sources: OrderedDict[CodeType, list[str]] = OrderedDict()
+        self._on_disk: dict[tuple[str, bool], list[str]] = {}
+        self._directories: dict[bool, Path] = {}
+        """keyed by whether they get deleted at exit"""
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._sources)
+
+    def register(
+        self, code: CodeType, get_source: Callable[[], str], mode: Literal["linecache", "tempfile", "file"] = "linecache"
+    ):
+        filename = code.co_filename
+
+        with self._lock:
+            if (lines := self._sources.get(code)) is None:
+                lines = self._sources[code] = get_source().splitlines(True)
+                self._evict()
+            else:
+                self._sources.move_to_end(code)
+
+            # namesake templates share a filename, so the one which failed last wins, just like a module being reloaded
+            if (entry := linecache.cache.get(filename)) is None or entry[2] is not lines:
+                linecache.cache[filename] = (sum(map(len, lines)), None, lines, filename)  # no mtime, so never re-checked
+
+            if mode != "linecache" and self._on_disk.get((filename, mode == "tempfile")) is not lines:
+                self._write(filename, lines, mode == "tempfile")
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+        while len(self._sources) > self.maxsize:
+            code, lines = self._sources.popitem(last=False)
+            if (entry := linecache.cache.get(code.co_filename)) is not None and entry[2] is lines:
+                del linecache.cache[code.co_filename]
+
+    def _get_directory(self, auto_deletion: bool):
+        if (directory := self._directories.get(auto_deletion)) is None:
+            from tempfile import mkdtemp
+
+            directory = self._directories[auto_deletion] = Path(mkdtemp(prefix="promplate-"))
+            sys_path.append(str(directory))  # so that debuggers resolve the relative filenames
+
+            if auto_deletion:
+                import atexit
+                from shutil import rmtree
+
+                atexit.register(rmtree, directory, ignore_errors=True)
+
+        return directory
+
+    def _write(self, filename: str, lines: list[str], auto_deletion: bool):
+        try:
+            (self._get_directory(auto_deletion) / filename).write_text("".join(lines))
+        except OSError:
+            return  # tracebacks still work through `linecache`
+        self._on_disk[filename, auto_deletion] = lines
+
+    def clear(self):
+        with self._lock:
+            for code, lines in self._sources.items():
+                if (entry := linecache.cache.get(code.co_filename)) is not None and entry[2] is lines:
+                    del linecache.cache[code.co_filename]
+            self._sources.clear()
+
+
+source_registry = SourceRegistry()  # shared by every `TemplateCore` in the process
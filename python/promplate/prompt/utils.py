@@ -1,8 +1,18 @@
-from functools import cache, cached_property, wraps
+from dis import get_instructions
+from functools import cache, wraps
 from inspect import currentframe, isclass
-from pathlib import Path
 from re import compile
-from typing import Any, Callable, ParamSpec, TypeVar
+from types import CodeType, FrameType
+from typing import (
+    Any,
+    Callable,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    ParamSpec,
+    TypeVar,
+)
+from weakref import WeakKeyDictionary
 
 split_template_tokens = compile(
     r"((?:\s{%-|{%).*?(?:%}|-%}\s))|((?:\s{{-|{{)[\s\S]*?(?:}}|-}}\s))|((?:\s{#-|{#)[\s\S]*?(?:#}|-#}\s))"
@@ -23,23 +33,54 @@ def ensure_valid(name):
         raise NameError(name)
 
 
+_store_opnames = frozenset(("STORE_NAME", "STORE_FAST", "STORE_GLOBAL", "STORE_DEREF", "STORE_FAST_LOAD_FAST"))
+_assigned_names: "WeakKeyDictionary[CodeType, dict[int, str]]" = WeakKeyDictionary()
+
+
+def _collect_assigned_names(code: CodeType):
+    """map the offset of every instruction whose result is directly stored into a variable, to that variable's name"""
+
+    names: dict[int, str] = {}
+    instructions = list(get_instructions(code))
+    following_of = {instruction.offset: following for instruction, following in zip(instructions, instructions[1:])}
+    by_offset = {instruction.offset: instruction for instruction in instructions}
+
+    for instruction in instructions:
+        following = following_of.get(instruction.offset)
+        if following is not None and following.opname in ("JUMP_FORWARD", "JUMP"):  # `a = ... if ... else ...`
+            following = by_offset.get(following.argval)
+        if following is not None and following.opname in ("DUP_TOP", "COPY"):  # `a = b = ...`
+            following = following_of.get(following.offset)
+        if following is not None and following.opname in _store_opnames:
+            names[instruction.offset] = following.argval[0] if isinstance(following.argval, tuple) else following.argval
+    return names
+
+
+def get_assigned_name(frame: FrameType | None):
+    """name of the variable the value currently being computed in `frame` is about to be assigned to, if any"""
+
+    if frame is None:
+        return None
+    code = frame.f_code
+    if (names := _assigned_names.get(code)) is None:
+        names = _assigned_names[code] = _collect_assigned_names(code)
+    return names.get(frame.f_lasti)
+
+
 class AutoNaming:
+    auto_naming = True
+    """infer `name` from the variable an instance gets assigned to when constructed, set it to `False` to skip that"""
+
+    _name: str | None = None
+
     def __new__(cls, *args, **kwargs):
         obj = super().__new__(cls)
-        obj._bind_frame()
+        if cls.auto_naming and (frame := currentframe()) is not None:
+            # resolved right away from the caller's bytecode, so no frame outlives this call
+            obj._name = get_assigned_name(frame.f_back)
+            del frame
         return obj
 
-    def _bind_frame(self):
-        self._frame = currentframe()
-
-    @cached_property
-    def _name(self):
-        f = self._frame
-        if f and f.f_back and (frame := f.f_back.f_back):
-            for name, var in frame.f_locals.items():
-                if var is self:
-                    return name
-
     @property
     def class_name(self):
         return self.__class__.__name__
@@ -53,11 +94,10 @@ class AutoNaming:
     @name.setter
     def name(self, name):
         self._name = name
-        self._frame = None
 
     @name.deleter
     def name(self):
-        del self._name
+        self.__dict__.pop("_name", None)
 
     def __repr__(self):
         if self._name:
@@ -139,27 +179,51 @@ def _get_aclient():
     return AsyncClient(follow_redirects=True, http2=_is_http2_available())
 
 
-def add_linecache(filename: str, source_getter: Callable[[], str]):
-    import linecache
+class GlobalNames(NamedTuple):
+    loads: frozenset[str]
+    stores: frozenset[str]
 
-    linecache.cache[filename] = (source_getter,)
 
+_dynamic_scope_names = frozenset(("locals", "globals", "vars", "eval", "exec", "dir"))
 
-def save_tempfile(filename: str, source: str, auto_deletion: bool):
-    from tempfile import gettempdir, mkdtemp
 
-    for i in Path(gettempdir()).glob(f"promplate-*/{filename}"):
-        i.unlink()
+def collect_global_names(code: CodeType):
+    """collect the global names a code object (and the code nested in it) reads and writes"""
+    loads: set[str] = set()
+    stores: set[str] = set()
+    codes = [code]
+    while codes:
+        code = codes.pop()
+        for instruction in get_instructions(code):
+            match instruction.opname:
+                case "LOAD_GLOBAL" | "LOAD_NAME" | "LOAD_FROM_DICT_OR_GLOBALS":
+                    loads.add(instruction.argval)
+                case "STORE_GLOBAL" | "DELETE_GLOBAL":
+                    stores.add(instruction.argval)
+        codes.extend(const for const in code.co_consts if isinstance(const, CodeType))
 
-    file = Path(mkdtemp(prefix="promplate-")) / filename
-    file.write_text(source)
+    return GlobalNames(frozenset(loads), frozenset(stores))
 
-    if auto_deletion:
-        import atexit
 
-        @atexit.register
-        def _():
-            file.unlink(missing_ok=True)
-            file.parent.rmdir()
+def get_global_names(code: CodeType):
+    """like `collect_global_names`, but returns `None` if the code may access its namespace dynamically"""
+    names = collect_global_names(code)
+    return None if not names.loads.isdisjoint(_dynamic_scope_names) else names
 
-    return file
+
+def flatten_context(context: Mapping[str, Any], names: frozenset[str]):
+    flat = {}
+    for name in names:
+        try:
+            flat[name] = context[name]
+        except KeyError:
+            pass
+    return flat
+
+
+def write_back_context(context: MutableMapping[str, Any], flat: dict[str, Any], names: frozenset[str]):
+    for name in names:
+        if name in flat:
+            context[name] = flat[name]
+        else:
+            context.pop(name, None)
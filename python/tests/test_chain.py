@@ -1,6 +1,6 @@
 from typing import cast
 
-from promplate import Chain, ChainContext, Jump, Loop, Node
+from promplate import Callback, Chain, ChainContext, Jump, Loop, Node, Parallel
 
 
 def as_is(prompt: str, **_):
@@ -86,3 +86,172 @@ def test_processes():
 
     list(node.stream(context := {"results": []}, zero_to_three))
     assert context["results"] == ["0", "01", "012", "0123", "end"]
+
+
+def test_parallel_isolated_branches():
+    a = Node("{{ x }}a")
+    b = Node("{{ x }}b{{ y }}")
+
+    @a.end_process
+    def _(context: ChainContext):
+        context["y"] = "!"  # invisible to `b`, which runs in its own layer
+
+    group = Parallel(a, b, merge=Parallel.collect())
+    context = group.invoke({"x": "x", "y": ""}, complete=as_is)
+    assert context["results"] == ["xa", "xb"]
+    assert context.result == "xb" and context["y"] == "!"
+
+
+async def test_parallel_runs_concurrently():
+    from asyncio import Event
+
+    started = Event()
+
+    async def complete(prompt: str, **_):
+        if prompt == "1":
+            started.set()
+        else:
+            await started.wait()  # deadlocks unless both branches run at once
+        return prompt
+
+    assert (await Parallel(Node("2"), Node("1")).ainvoke(complete=complete)).result == "1"
+
+    stream = Parallel(Node("ab"), Node("cd")).astream(generate=lambda prompt, **_: iter(prompt), mode="delta")
+    assert sorted([event.delta async for event in stream]) == ["a", "b", "c", "d"]
+
+
+def test_parallel_stream_stops_with_its_consumer():
+    from time import monotonic, sleep
+
+    produced = []
+
+    def generate(prompt: str, **_):
+        while True:
+            sleep(0.01)
+            produced.append(prompt)
+            yield prompt
+
+    stream = Parallel(Node("a"), Node("b"), Node("c"), concurrency=2).stream(generate=generate, mode="delta")
+    next(stream)
+    started = monotonic()
+    stream.close()
+    assert monotonic() - started < 0.5  # without waiting for the endless branches
+    sleep(0.05)
+    count = len(produced)
+    sleep(0.05)
+    assert len(produced) == count and "c" not in produced  # they stopped, and the queued one never started
+
+
+def test_parallel_jump_after_merge():
+    b = Node("b")
+
+    @b.end_process
+    def _(_):
+        raise Jump(out_of=chain)
+
+    chain = Chain(Parallel(Node("a"), b, merge=Parallel.collect()), Node("unreachable"))
+
+    context = chain.invoke(complete=as_is)
+    assert context["results"] == ["a", "b"] and context.result == "b"
+
+    context = ChainContext()
+    for _ in chain.stream(context, generate=lambda prompt, **_: iter(prompt)):
+        pass
+    assert context["results"] == ["a", "b"] and context.result == "b"
+
+
+def test_invoke_many():
+    def complete(prompt: str, **_):
+        if prompt == "3":
+            raise ValueError(prompt)
+        return prompt
+
+    node = Node("{{ i }}")
+    outcomes = list(node.invoke_many(({"i": i} for i in range(20)), complete, concurrency=4))
+
+    assert [outcome.index for outcome in outcomes] == list(range(20))
+    assert [outcome.context.result for outcome in outcomes if outcome.error is None] == [str(i) for i in range(20) if i != 3]
+    assert isinstance(outcomes[3].error, ValueError) and outcomes[3].context["i"] == 3
+
+
+def test_invoke_many_cold_template():
+    """without the GIL serialising `cached_property` (python 3.12+), every thread used to compile the same template at once"""
+
+    from sys import getswitchinterval, setswitchinterval
+
+    text = "".join(f"{{% if i %}}{{{{ i + {k} }}}}{{% else %}}-{{% endif %}}" for k in range(300))
+    interval = getswitchinterval()
+    setswitchinterval(1e-6)
+    try:
+        outcomes = list(Node(text).invoke_many(({"i": i} for i in range(32)), as_is, concurrency=16))
+    finally:
+        setswitchinterval(interval)
+
+    assert [outcome.error for outcome in outcomes] == [None] * 32
+    assert outcomes[5].context.result == "".join(str(5 + k) for k in range(300))
+
+
+async def test_ainvoke_many():
+    from asyncio import sleep
+
+    running = peak = 0
+
+    async def complete(prompt: str, **_):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await sleep(0.01 if prompt == "0" else 0)
+        running -= 1
+        if prompt == "5":
+            raise ValueError(prompt)
+        return prompt
+
+    async def contexts():
+        for i in range(10):
+            yield {"i": i}
+
+    node = Node("{{ i }}")
+    outcomes = [outcome async for outcome in node.ainvoke_many(contexts(), complete, concurrency=3)]
+    assert [outcome.index for outcome in outcomes] == list(range(10)) and peak == 3
+    assert isinstance(outcomes[5].error, ValueError) and outcomes[9].context.result == "9"
+
+    outcomes = [outcome async for outcome in node.ainvoke_many([{"i": i} for i in range(3)], complete, ordered=False)]
+    assert outcomes[-1].index == 0
+
+
+def count_words(context: ChainContext):
+    context["words"] = len(context.result.split())  # assigned to the copy, merged back all the same
+
+
+async def test_offloaded_processes():
+    from concurrent.futures import ProcessPoolExecutor
+    from threading import get_ident
+
+    loop_thread = get_ident()
+    threads = []
+
+    def in_thread(context: ChainContext):
+        threads.append(get_ident())
+        return {"upper": context.result.upper()}
+
+    node = Node("a b c").add_end_processes(in_thread, offload=True)
+    context = await node.ainvoke(complete=as_is)
+    assert context["upper"] == "A B C" and threads != [loop_thread]
+
+    with ProcessPoolExecutor(1) as pool:
+        node = Node("a b c").add_end_processes(count_words, offload=pool)
+        assert (await node.ainvoke(complete=as_is))["words"] == 3
+
+    async def on_loop(context: ChainContext):
+        threads.append(get_ident())
+        context["lower"] = context.result.lower()
+
+    class Async(Callback):
+        async def end_process(self, context):
+            threads.append(get_ident())
+            return {"title": context.result.title()}
+
+    threads.clear()
+    node = Node("A B C").add_end_processes(on_loop, offload=True) + Node("a b c").add_callbacks(Async(offload=True))
+    context = await node.ainvoke(complete=as_is)
+    assert context["lower"] == "a b c" and context["title"] == "A B C" and threads == [loop_thread] * 2
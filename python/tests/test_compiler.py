@@ -0,0 +1,53 @@
+"""Tests for the compile time optimisations, which must never change what a template renders."""
+
+from copy import copy
+
+from pytest import mark, raises
+
+from promplate import Template
+
+cases = [
+    ("Hello, {{ name }}!", {"name": "Ned"}, "Hello, Ned!"),
+    ("{% for n in nums %}{{ n }}, {% else %}done{% endfor %}", {"nums": [1, 2, 3]}, "1, 2, 3, done"),
+    ("{% if a %}A{% elif b %}B{% else %}C{% endif %}", {"a": 0, "b": 1}, "B"),
+    ("{% while nums %}{{ nums.pop() }}{% endwhile %}", {"nums": [1, 2, 3]}, "321"),
+    ("@{% for n in nums -%}\n{{ n -}}\n{% endfor %}!", {"nums": [0, 1]}, "@01!"),
+    ("{# a = 1 \n b = 2 #}{{ a + b }}{{ f'{a}' }}{{ 'x'.upper() + '!' }}", {}, "31X!"),
+    ("{{\n    total = 0\n    for i in range(10):\n        total += i\n    total\n}}", {}, "45"),
+    ("{{ [\n1,\n2,\n] }}{{ -1 }}{{ 2 ** 10 }}{{ '=' * 3 }}{{ None }}", {}, "[1, 2]-11024===None"),
+    ("{% for i in '12' %}{% c x=i %}{% endfor %}", {"c": Template("<{{ x }}>")}, "<1><2>"),
+    ("{% if 0 %}0{% endif %}{## comment ##}{% if 1 %}{% endif %}", {}, ""),
+]
+
+
+def fresh(context: dict):
+    return {key: copy(value) for key, value in context.items()}
+
+
+@mark.parametrize("text, context, expected", cases)
+async def test_same_output(text, context, expected):
+    t = Template(text)
+    assert t.render(fresh(context)) == await t.arender(fresh(context)) == expected
+    assert "".join(t.render_iter(fresh(context))) == "".join([i async for i in t.arender_iter(fresh(context))]) == expected
+
+
+def test_literal_coalescing_and_folding():
+    script = Template("a{{ 'b' }}{{ 1 + 2 }}c{{ d }}{{ 'e' * 2 }}").get_script()
+    assert "__append__('ab3c')" in script
+    assert "__append__(d)" in script
+    assert "__append__('ee')" in script
+    assert "map(str, __parts__)" in script
+    assert "'=' * 10000" in Template("{{ '=' * 10000 }}").get_script()
+
+    assert "''.join(__parts__)" in Template("a{{ 'b'.upper() }}{{ f'{c}' }}").get_script()
+    streaming = Template("{{ 'b'.upper() }}{{ c }}").get_script(stream=True)
+    assert "yield 'b'.upper()" in streaming and "yield str(c)" in streaming
+
+
+def test_errors():
+    with raises(SyntaxError):
+        Template("{{ var%&!@ }}").render()
+    with raises(IndexError):
+        Template("{% bogus %}!!{% endbogus %}").render({"bogus": Template("")})
+    with raises(ZeroDivisionError):
+        Template("{{ 1 / 0 }}").render()
@@ -0,0 +1,128 @@
+from asyncio import sleep
+
+from pytest import raises
+
+from promplate import Chain, ChainContext, Graph, Jump, Node
+
+
+def as_is(prompt: str, **_):
+    return prompt
+
+
+def test_dependencies_inferred_from_templates():
+    graph = Graph()
+    topic = graph.add(Node("{{ text }}!"), output="topic")
+    entities = graph.add(Node("{{ text }}?"), output="entities")
+    summary = graph.add(Node("{{ topic }} {{ entities }}"), output="summary")
+    graph.add(Node("{{ summary }}."))
+
+    assert [step.after for step in graph.steps] == [set(), set(), {0, 1}, {2}]
+    assert graph.steps[0].reads == {"text"}
+
+    context = graph.invoke({"text": "hi"}, complete=as_is)
+    assert context["summary"] == "hi! hi?"
+    assert context.result == "hi! hi?."
+
+    with raises(ValueError):
+        graph.add(Node(""), after=[Node("")])
+
+    assert topic is graph.steps[0].node and entities and summary
+
+
+def test_write_conflicts_keep_order():
+    graph = Graph()
+    graph.add(Node("{{ x }}"), output="y")
+    graph.add(Node("1"), output="x")  # would change what the first step reads
+    graph.add(Node("2"), output="x")
+    assert [step.after for step in graph.steps] == [set(), {0}, {0, 1}]
+    assert graph.invoke({"x": 0}, complete=as_is)["x"] == "2"
+
+
+async def test_critical_path():
+    async def complete(prompt: str, **_):
+        await sleep(float(prompt))
+        return prompt
+
+    graph = Graph()
+    graph.add(Node("0.05"), reads=(), output="slow")
+    graph.add(Node("0.01"), reads=(), output="fast")
+    last = graph.add(Node("0.01"), reads=["slow"], output="last")
+    graph.add(Node("0"), reads=["fast"])
+
+    context = await graph.ainvoke(complete=complete)
+
+    report = context["__graph_report__"]
+    slow, fast, after_slow, _ = report.timings
+    assert slow and fast and after_slow
+    assert slow.start < fast.end and fast.start < slow.end  # ran side by side
+    assert after_slow.start >= slow.end and report.elapsed >= after_slow.end
+    assert [timing.node for timing in report.critical_path] == [graph.steps[0].node, last]
+
+
+async def test_concurrency_limit():
+    running = peak = 0
+
+    async def complete(prompt: str, **_):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await sleep(0.01)
+        running -= 1
+        return prompt
+
+    graph = Graph(concurrency=2)
+    for i in range(5):
+        graph.add(Node(str(i)), output=f"r{i}")
+
+    context = await graph.ainvoke(complete=complete)
+    assert peak == 2 and context["r4"] == "4"
+
+    events = [event.delta async for event in graph.astream(generate=lambda prompt, **_: iter(prompt), mode="delta")]
+    assert sorted(events) == ["0", "1", "2", "3", "4"]
+
+
+def test_closed_stream_stops_the_schedule():
+    from time import sleep as block
+
+    produced = []
+
+    def generate(prompt: str, **_):
+        while True:
+            block(0.01)
+            produced.append(prompt)
+            yield prompt
+
+    graph = Graph()
+    first = graph.add(Node("a"), output="a")
+    graph.add(Node("b"), output="b", after=[first])
+
+    stream = graph.stream(context := ChainContext(), generate=generate, mode="delta")
+    next(stream)
+    stream.close()
+    block(0.05)
+    count = len(produced)
+    block(0.05)
+    assert len(produced) == count and "b" not in produced
+    assert context["__graph_report__"].timings[1] is None  # each run reports on its own context
+
+
+def test_jump_out_of_graph():
+    a = Node("a")
+    b = Node("b")
+
+    @a.end_process
+    def _(_):
+        raise Jump(out_of=chain)
+
+    graph = Graph()
+    graph.add(a, output="a")
+    graph.add(b, output="b", after=[a])
+    chain = Chain(graph, Node("unreachable"))
+
+    context = chain.invoke(complete=as_is)
+    assert context["a"] == "a" and "b" not in context
+
+    context = ChainContext()
+    for _ in chain.stream(context, generate=lambda prompt, **_: iter(prompt)):
+        pass
+    assert context["a"] == "a" and "b" not in context
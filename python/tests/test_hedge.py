@@ -0,0 +1,121 @@
+from asyncio import CancelledError, sleep
+from time import sleep as block
+from time import time
+
+from pytest import raises
+
+from promplate import Node
+from promplate.llm.hedge import AsyncHedgedComplete, HedgedComplete, HedgedLLM
+
+
+async def test_backup_wins_and_slow_request_is_cancelled():
+    calls = 0
+    cancelled = False
+
+    async def complete(prompt, **_):
+        nonlocal calls, cancelled
+        calls += 1
+        if calls == 1:
+            try:
+                await sleep(1)
+            except CancelledError:
+                cancelled = True
+                raise
+        return prompt
+
+    hedged = AsyncHedgedComplete(complete, delay=0.01)
+    assert await hedged("x") == "x"
+    await sleep(0)
+    assert calls == 2 and cancelled
+    assert (hedged.hedged, hedged.backup_wins) == (1, 1)
+    assert hedged.latencies[0] >= 0.01  # what the caller waited, not just the backup's own time
+
+
+async def test_fast_requests_are_not_hedged():
+    async def complete(prompt, **_):
+        return prompt
+
+    hedged = AsyncHedgedComplete(complete, percentile=90, min_samples=5)
+    assert hedged.hedge_delay() is None
+    for _ in range(5):
+        await hedged("x")
+    assert hedged.hedge_delay() is not None and hedged.hedged == 0
+
+
+async def test_only_transient_failures_retry_as_hedges():
+    calls = 0
+
+    async def complete(prompt, **_):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError
+        return prompt
+
+    with raises(ConnectionError):
+        await AsyncHedgedComplete(complete)("x")  # without a hedge delay nothing is retried
+    calls = 0
+    assert await AsyncHedgedComplete(complete, delay=0.01)("x") == "x" and calls == 2
+    calls = 0
+    with raises(ConnectionError):
+        await AsyncHedgedComplete(complete, delay=0.01, max_hedges=0)("x")
+
+    async def invalid(prompt, **_):
+        nonlocal calls
+        calls += 1
+        raise ValueError(prompt)
+
+    calls = 0
+    with raises(ValueError):
+        await AsyncHedgedComplete(invalid, delay=5)("x")
+    assert calls == 1
+
+
+def test_sync_hedging_and_deadline():
+    calls = 0
+
+    def complete(prompt, **_):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            block(0.3)
+        return prompt
+
+    hedged = HedgedComplete(complete, delay=0.01)
+    assert hedged("x") == "x" and hedged.backup_wins == 1 and hedged.latencies[0] >= 0.01
+
+    with raises(TimeoutError):
+        HedgedComplete(lambda prompt, **_: block(0.3))("x", deadline=time() + 0.02)
+
+    def invalid(prompt, **_):
+        nonlocal calls
+        calls += 1
+        raise ValueError(prompt)
+
+    calls = 0
+    started = time()
+    with raises(ValueError):
+        HedgedComplete(invalid, delay=5)("x")
+    assert calls == 1 and time() - started < 1
+
+
+async def test_deadline_through_node_config():
+    class Slow:
+        async def complete(self, prompt, **config):
+            assert "deadline" not in config
+            await sleep(1)
+            return prompt
+
+        async def generate(self, prompt, **_):
+            yield prompt
+            await sleep(1)
+            yield prompt
+
+    node = Node("x", llm=HedgedLLM(Slow(), percentile=None))  # type: ignore
+
+    with raises(TimeoutError):
+        await node.ainvoke(deadline=time() + 0.02)
+
+    with raises(TimeoutError):
+        async for _ in node.astream(deadline=time() + 0.02):
+            pass
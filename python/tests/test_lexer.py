@@ -0,0 +1,50 @@
+"""Tests for the single-pass lexer, which must split templates exactly like `split_template_tokens`."""
+
+from random import Random
+
+from promplate.prompt.lexer import Lexer, tokenize
+from promplate.prompt.utils import split_template_tokens
+
+pieces = ["{", "}", "%", "#", "-", " ", "\n", "\t", "a", "{{", "}}", "{%", "%}", "{#", "#}", "{{-", "-}}", "{%-", "-%}"]
+
+
+def random_texts(count: int, seed=0):
+    random = Random(seed)
+    for _ in range(count):
+        yield "".join(random.choice(pieces) for _ in range(random.randint(0, 30)))
+
+
+def test_same_split_as_regex():
+    for text in random_texts(5000):
+        assert [token.text for token in tokenize(text)] == [token for token in split_template_tokens(text) if token]
+
+
+def test_kinds_and_positions():
+    text = "a {{- b -}} c\n{% if x -%}\n{# y #}{{ z }\n"
+    tokens = tokenize(text)
+    assert [token.kind for token in tokens] == ["literal", "eval", "literal", "special", "exec", "literal"]
+    assert all(text[token.start : token.end] == token.text for token in tokens)
+    assert tokens[1].text == " {{- b -}} "  # `-` eats one whitespace character on its side
+    assert tokens[-1].text == "{{ z }\n"  # never closed, so it's text
+
+
+def test_incremental_edits():
+    random = Random(1)
+    for text in random_texts(1000, seed=1):
+        lexer = Lexer(text)
+        for _ in range(5):
+            start = random.randint(0, len(lexer.text))
+            end = random.randint(start, min(len(lexer.text), start + 5))
+            lexer.edit(start, end, "".join(random.choice(pieces) for _ in range(random.randint(0, 4))))
+            assert lexer.tokens == tokenize(lexer.text)
+
+
+def test_edits_relex_locally():
+    lexer = Lexer("{{ a }}\n" * 1000)
+    assert lexer.edit(4003, 4004, "b") == 2
+    assert lexer.tokens[1000].text == "{{ b }}" and lexer.locate(lexer.tokens[1000].start) == (501, 1)
+
+    lexer.edit(0, 0, "{#")
+    assert lexer.tokens[0] == ("literal", "{#", 0, 2)
+    lexer.edit(len(lexer.text), len(lexer.text), "#}")  # closes the `{#` far before the edit
+    assert [token.kind for token in lexer.tokens] == ["exec"]
@@ -0,0 +1,151 @@
+from asyncio import create_task, gather, sleep
+
+from pytest import mark
+
+from promplate import Node
+from promplate.llm.cache import (
+    CachedAsyncComplete,
+    CachedComplete,
+    CachedGenerate,
+    CachedLLM,
+    FileBackend,
+    MemoryBackend,
+    ResponseCache,
+    SQLiteBackend,
+)
+
+
+def test_complete_and_generate_share_entries():
+    calls = []
+
+    def complete(prompt, **config):
+        calls.append(prompt)
+        return prompt.upper()
+
+    def generate(prompt, **config):
+        calls.append(prompt)
+        yield from prompt
+
+    cache = ResponseCache()
+    cached_complete, cached_generate = CachedComplete(complete, cache), CachedGenerate(generate, cache)
+
+    assert cached_complete("ab", temperature=0) == "AB"
+    assert cached_complete("ab", temperature=0) == "AB"
+    assert list(cached_generate("ab", temperature=0, stream=True)) == ["AB"]  # `stream` isn't part of the key
+    assert list(cached_generate("cd")) == ["c", "d"] == list(cached_generate("cd"))
+    assert cached_complete("cd") == "cd"
+    assert cached_complete("ab", temperature=1) == "AB"
+
+    assert calls == ["ab", "cd", "ab"]
+    assert (cache.hits, cache.misses) == (4, 3)
+
+
+def test_abandoned_stream_is_not_cached():
+    calls = 0
+
+    def generate(prompt, **_):
+        nonlocal calls
+        calls += 1
+        yield from prompt
+
+    cached = CachedGenerate(generate)
+    next(iter(stream := cached("abc")))
+    stream.close()
+    assert list(cached("abc")) == ["a", "b", "c"] and calls == 2
+
+    first, second = cached("xy"), cached("xy")  # interleaved in one thread, so the second can't wait for the first
+    assert list(zip(first, second)) == [("x", "x"), ("y", "y")]
+
+
+def test_bound_config_is_part_of_the_key():
+    class Client:
+        def __init__(self, **run_config):
+            self._run_config = run_config
+
+        def complete(self, prompt, **config):
+            return f"{prompt} from {(self._run_config | config)['model']}"
+
+    cache = ResponseCache()
+    small, large = CachedComplete(Client(model="small").complete, cache), CachedComplete(Client(model="large").complete, cache)
+    assert small("hi") == "hi from small" and large("hi") == "hi from large"
+    assert large("hi", model="small") == small("hi") and cache.hits == 2
+
+
+def test_failed_backend_write_is_only_logged(caplog):
+    class Broken(MemoryBackend):
+        def set(self, key, chunks):
+            raise OSError("disk full")
+
+    cache = ResponseCache(Broken())
+    cached = CachedComplete(str.upper, cache)
+    assert cached("ab") == "AB" == cached("ab")  # the second call must not wait for a write that never landed
+    assert not cache._inflight and cache.misses == 2
+    assert "failed to cache" in caplog.text
+
+
+async def test_single_flight():
+    calls = 0
+
+    async def complete(prompt, **_):
+        nonlocal calls
+        calls += 1
+        await sleep(0.01)
+        return prompt
+
+    cached = CachedAsyncComplete(complete)
+    assert await gather(*(cached("same") for _ in range(5))) == ["same"] * 5
+    assert calls == 1
+
+    leader = create_task(cached("cancelled"))
+    waiter = create_task(cached("cancelled"))
+    await sleep(0)
+    waiter.cancel()
+    assert await leader == "cancelled" and calls == 2
+
+    leader = create_task(cached("retried"))
+    waiter = create_task(cached("retried"))
+    await sleep(0)
+    leader.cancel()
+    assert await waiter == "retried" and calls == 4  # took over instead of being cancelled too
+
+
+@mark.parametrize("backend", ["memory", "file", "sqlite"])
+def test_backends(backend, tmp_path):
+    def make(ttl=None):
+        match backend:
+            case "memory":
+                return MemoryBackend(ttl=ttl)
+            case "file":
+                return FileBackend(tmp_path, ttl)
+            case _:
+                return SQLiteBackend(tmp_path / "cache.db", ttl)
+
+    store = make()
+    assert store.get("key") is None
+    store.set("key", ["a", "b"])
+    assert store.get("key") == ["a", "b"]
+
+    if backend != "memory":
+        assert make().get("key") == ["a", "b"]  # persisted
+        assert make(ttl=0).get("key") is None
+
+
+async def test_as_node_llm():
+    calls = 0
+
+    class Echo:
+        def complete(self, prompt, **_):
+            nonlocal calls
+            calls += 1
+            return prompt
+
+        async def generate(self, prompt, **_):
+            for chunk in prompt:
+                yield chunk
+
+    node = Node("{{ x }}", llm=CachedLLM(Echo()))  # type: ignore
+    assert node.invoke({"x": 1}).result == node.invoke({"x": 1}).result == "1"
+    assert calls == 1
+
+    assert [c.result async for c in node.astream({"x": 23})][-1] == "23"
+    assert (await node.ainvoke({"x": 23}, complete=None)).result == "23"
@@ -2,7 +2,7 @@ from operator import setitem
 
 from pytest import raises
 
-from promplate import BaseCallback, Callback, ChainContext, Node
+from promplate import BaseCallback, Callback, Chain, ChainContext, Node
 
 
 def test_add_callback_by_lambda():
@@ -70,6 +70,55 @@ async def test_node_astream():
     assert [int(i.result) async for i in node.astream({"nums": 123}, generate)] == [1, 12, 123]
 
 
+async def test_node_stream_buffer():
+    from promplate.chain.utils import StreamingResult
+
+    node = Node("")
+    deltas, lengths = [], []
+
+    @node.mid_process
+    def _(context: ChainContext):
+        deltas.append(context.delta)
+        lengths.append(len(result := context["__result__"]))
+        assert isinstance(result, str) and result.startswith("a") and result[-1:] == context.delta
+
+    @node.end_process
+    def _(context: ChainContext):
+        assert context.delta is None and context["__result__"] == "abc"
+
+    generate = lambda *_, **__: iter("abc")
+    assert [str(context.result) for context in node.stream(None, generate)] == ["a", "ab", "abc"]
+    assert [context.result async for context in node.astream(None, generate)][-1] == "abc"
+    assert deltas == [*"abc", *"abc"] and lengths == [1, 2, 3] * 2
+
+    buffer = StreamingResult()
+    for chunk in ["x"] * 10000:
+        buffer.append(chunk)
+    assert str(buffer) == "x" * 10000 and len(buffer) == 10000 and buffer == "x" * 10000 and buffer.delta == "x"
+
+
+async def test_mid_process_replacing_streamed_result():
+    node = Node("")
+
+    @node.mid_process
+    def _(context: ChainContext):
+        if context.delta == "c":
+            context.result = context.result.upper()
+
+    generate = lambda *_, **__: iter("abc")
+    assert list(node.stream(None, generate))[-1].result == "ABC"
+    assert [context.result async for context in node.astream(None, generate)][-1] == "ABC"
+
+    appending = Node("")
+
+    @appending.mid_process
+    def _(context: ChainContext):
+        if context.delta == "c":
+            context["__result__"] += "!"  # works like on any str
+
+    assert list(appending.stream(None, generate))[-1].result == "abc!"
+
+
 def test_context_behavior():
     a = Node("{{ a }}", {"a": 1})
     b = Node("{{ b }}")
@@ -131,3 +180,83 @@ def test_config_overwrite():
     node = Node("")
     node.run_config["key"] = "1"
     assert node.invoke(complete=lambda _, key: key, key="2").result == "2"  # type: ignore
+
+
+async def test_stream_deltas():
+    from promplate import Chain, Jump, Loop, StreamEvent
+
+    a, b = Node("ab"), Node("cd")
+    generate = lambda prompt, **_: iter(prompt)
+    chain = a + b
+
+    events = list(chain.stream(None, generate, mode="delta"))
+    assert events == [(a, "a", 1), (a, "b", 2), (b, "c", 1), (b, "d", 2)]
+    assert all(isinstance(event, StreamEvent) for event in events)
+    assert [event async for event in chain.astream(None, generate, mode="delta")] == events
+
+    loop = Loop(a)
+
+    @loop.end_process
+    def _(context):
+        raise Jump(out_of=loop)
+
+    assert [event.delta for event in loop.stream(None, generate, mode="delta")] == ["a", "b"]
+    assert isinstance(Chain(loop).stream(None, generate).__next__(), ChainContext)
+
+
+async def test_progress_steps_and_plain_children():
+    from promplate.chain.node import Interruptable
+
+    class Ticker(Interruptable):
+        def __init__(self):
+            self._context = None
+            self.callbacks = []
+
+        def _stream(self, context, /, generate, callbacks, **config):
+            for _ in range(3):
+                yield  # progress, without an event to describe it
+
+        async def _astream(self, context, /, generate, callbacks, **config):
+            for _ in range(3):
+                yield
+
+    class Plain:  # an `AbstractNode` which knows nothing about `mode`
+        def stream(self, context, generate, **config):
+            assert not config
+            yield from Node("xy").stream(context, generate)
+
+        async def astream(self, context, generate, **config):
+            assert not config
+            async for step in Node("xy").astream(context, generate):
+                yield step
+
+    steps = []
+    chain = Chain(Node("ab"), Ticker(), Plain())  # type: ignore
+    chain.add_mid_processes(lambda _: steps.append(None))
+    generate = lambda prompt, **_: iter(prompt)
+
+    assert len(list(chain.stream(None, generate))) == len(steps) == 7
+    assert [event.delta for event in chain.stream(None, generate, mode="delta")] == ["a", "b"] and len(steps) == 14
+    assert len([step async for step in chain.astream(None, generate)]) == 7
+
+
+async def test_coalesce():
+    from promplate import Coalesce
+
+    node = Node("abcdefg")
+    calls = []
+    node.add_mid_processes(lambda context: calls.append(context.delta))
+    generate = lambda prompt, **_: iter(prompt)
+
+    node.coalesce = Coalesce(chunks=3)
+    assert [event.delta for event in node.stream(None, generate, mode="delta")] == ["abc", "def", "g"]
+    assert calls == ["abc", "def", "g"]
+
+    node.coalesce = Coalesce(chars=2, interval=60)
+    assert [(event.delta, event.length) async for event in node.astream(None, generate, mode="delta")][-2:] == [
+        ("ef", 6),
+        ("g", 7),
+    ]
+
+    node.coalesce = Coalesce(interval=60)  # nothing is due before the end, which always flushes
+    assert [context.result for context in node.stream(None, generate)] == ["abcdefg"]
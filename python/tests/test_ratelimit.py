@@ -0,0 +1,138 @@
+from asyncio import gather, sleep
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import sleep as block
+
+from pytest import approx, importorskip
+
+from promplate.llm.ratelimit import (
+    Governor,
+    RateLimit,
+    RateLimiter,
+    TokenBucket,
+    estimate_tokens,
+)
+
+
+def test_token_bucket_reserves_in_order():
+    bucket = TokenBucket(60)  # one per second, bursting up to 60
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve() == approx(1, abs=0.01)
+    assert bucket.reserve() == approx(2, abs=0.01)  # queued behind the previous caller
+    assert bucket.reserve(1000) == approx(62, abs=0.01)  # clamped to the capacity, so it fits eventually
+
+
+def test_reconfiguring_keeps_the_current_state():
+    governor = Governor()
+    limiter = governor.get("http://a", None, "m", RateLimit(60), 1)
+    assert limiter.requests is not None and limiter.requests.reserve(60) == 0
+
+    assert governor.get("http://a", None, "m", None, None) is limiter  # another client, setting no limits itself
+    assert limiter.requests is not None and limiter.inflight is not None
+
+    governor.get("http://a", None, "m", RateLimit(120), 1)
+    assert limiter.requests.reserve() == approx(0.5, abs=0.01)  # at the new rate, but not refilled
+
+    inflight = limiter.inflight
+    inflight.acquire()
+    with ThreadPoolExecutor(1) as pool:
+        waiting = pool.submit(inflight.acquire)
+        block(0.01)
+        assert inflight.queued == 1
+        governor.get("http://a", None, "m", None, 2)
+        waiting.result(timeout=1)
+    assert inflight.active == 2
+
+
+def test_estimate_tokens():
+    assert estimate_tokens({"prompt": "x" * 40, "max_tokens": 5}) == 15
+    assert estimate_tokens({"messages": [{"role": "user", "content": "hi"}]}) > 0
+
+
+def test_inflight_shared_by_threads_and_coroutines():
+    governor = Governor()
+    limiter = governor.get("http://a", "key", "m1", None, 2)
+    other_model = governor.get("http://a", "key", "m2", None, 2)
+    assert limiter is not other_model and limiter.inflight is other_model.inflight
+
+    running = peak = 0
+    lock = Lock()
+
+    def work(limiter: RateLimiter):
+        nonlocal running, peak
+        with limiter.limit():
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            block(0.01)
+            with lock:
+                running -= 1
+
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(work, [limiter, other_model] * 3))
+
+    assert peak == 2
+    assert limiter.stats().calls == 3 and limiter.stats().waited > 0
+
+
+async def test_async_limits():
+    limiter = Governor().get("http://a", None, None, RateLimit(requests_per_minute=6000), 1)
+    running = peak = 0
+
+    async def work():
+        nonlocal running, peak
+        async with limiter.alimit():
+            running += 1
+            peak = max(peak, running)
+            await sleep(0.005)
+            running -= 1
+
+    await gather(*(work() for _ in range(5)))
+    assert peak == 1 and limiter.inflight is not None and limiter.inflight.active == 0
+
+
+async def test_cancelled_waiter_gives_its_slot_back():
+    from asyncio import create_task
+
+    limiter = RateLimiter(inflight=Governor().get("http://a", None, None, None, 1).inflight)
+    assert limiter.inflight is not None
+
+    async with limiter.alimit():
+        waiter = create_task(limiter.alimit().__aenter__())
+        await sleep(0)
+        waiter.cancel()
+        await gather(waiter, return_exceptions=True)
+        assert limiter.inflight.queued == 0
+
+    assert limiter.inflight.active == 0
+
+
+def test_openai_v1_clients_share_limits(monkeypatch):
+    importorskip("openai", minversion="1")
+
+    from types import SimpleNamespace
+
+    from promplate.llm.openai import v1
+
+    monkeypatch.setattr(v1, "governor", governor := Governor())
+
+    class FakeClient:
+        base_url = "https://example.com/v1/"
+        api_key = "sk-test"
+
+        class completions:
+            @staticmethod
+            def create(**config):
+                return SimpleNamespace(choices=[SimpleNamespace(text=config["prompt"].upper())])
+
+    first = v1.TextComplete(_max_in_flight=3, _rate_limit=RateLimit(600))
+    second = v1.TextComplete(_max_in_flight=3)
+    first.__dict__["_client"] = second.__dict__["_client"] = FakeClient  # instead of the cached property
+
+    assert first("a", model="m") == "A"
+    assert second("b", model="m") == "B"
+
+    assert list(governor.inflight) == ["https://example.com/v1/"]
+    assert [limiter.requests is not None for limiter in governor.limiters.values()] == [True]  # kept for `second` too
+    assert governor.stats() == {("https://example.com/v1/", "sk-...test", "m"): (2, 0, 0.0, 0.0)}
+    assert "_max_in_flight" not in first._config
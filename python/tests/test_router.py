@@ -0,0 +1,126 @@
+from asyncio import gather, sleep
+
+from pytest import raises
+
+from promplate import Node
+from promplate.llm.router import AsyncRouter, Backend, SyncRouter, is_transient
+
+
+class Fake:
+    def __init__(self, name: str, fail=False, delay=0.0):
+        self.name = name
+        self.fail = fail
+        self.delay = delay
+        self.calls = 0
+
+    def complete(self, prompt, **_):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError(self.name)
+        return self.name
+
+    def generate(self, prompt, **_):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError(self.name)
+        yield from self.name
+
+
+class AsyncFake(Fake):
+    async def complete(self, prompt, **_):
+        self.calls += 1
+        await sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(self.name)
+        return self.name
+
+    async def generate(self, prompt, **_):
+        self.calls += 1
+        await sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(self.name)
+        for chunk in self.name:
+            yield chunk
+
+
+def test_weighted_round_robin():
+    a, b = Fake("a"), Fake("b")
+    router = SyncRouter([Backend(a, weight=3), b])  # type: ignore
+    assert "".join(router.complete("") for _ in range(8)) == "aabaaaba"
+
+
+def test_failover_and_circuit_breaking(monkeypatch):
+    from promplate.llm import router as module
+
+    now = 0.0
+    monkeypatch.setattr(module, "monotonic", lambda: now)
+
+    broken, healthy = Fake("broken", fail=True), Fake("ok")
+    router = SyncRouter([broken, healthy], failure_threshold=2, cooldown=10)  # type: ignore
+
+    assert [router.complete("") for _ in range(4)] == ["ok"] * 4
+    assert broken.calls == 2 and router.backends[0].state == "open"  # skipped once the circuit opened
+
+    now = 11.0  # after the cooldown, a single trial fails and opens the circuit again
+    assert [router.complete("") for _ in range(2)] == ["ok"] * 2  # it's tried once round-robin picks it
+    assert broken.calls == 3 and router.backends[0].state == "open"
+
+    now = 22.0
+    broken.fail = False
+    assert sorted("".join(router.generate("")) for _ in range(2)) == ["broken", "ok"]
+    assert router.backends[0].state == "closed"
+
+    healthy.fail = broken.fail = True
+    with raises(ConnectionError):
+        router.complete("")
+
+
+async def test_async_strategies():
+    slow, fast = AsyncFake("slow", delay=0.02), AsyncFake("fast")
+    router = AsyncRouter([slow, fast], strategy="latency")  # type: ignore
+
+    await router.complete("")
+    await router.complete("")  # both measured now
+    assert {await router.complete("") for _ in range(5)} == {"fast"}
+
+    router = AsyncRouter([slow, fast], strategy="least_outstanding")  # type: ignore
+    results = await gather(*(router.complete("") for _ in range(4)))
+    assert sorted(results) == ["fast", "fast", "slow", "slow"]
+    assert [backend.outstanding for backend in router.backends] == [0, 0]
+
+
+async def test_stream_failover_as_node_llm():
+    router = AsyncRouter([AsyncFake("down", fail=True), AsyncFake("up")])  # type: ignore
+    node = Node("hi", llm=router)
+    assert [context.result async for context in node.astream()][-1] == "up"
+    assert (await node.ainvoke()).result == "up"
+
+
+def test_caller_errors_dont_fail_over():
+    class Rejecting(Fake):
+        def complete(self, prompt, **_):
+            self.calls += 1
+            raise ValueError("bad request")
+
+    class ServerError(Exception):
+        status_code = 503
+
+    assert is_transient(ServerError()) and is_transient(TimeoutError()) and not is_transient(ValueError())
+
+    rejecting, healthy = Rejecting("rejecting"), Fake("ok")
+    router = SyncRouter([rejecting, healthy], failure_threshold=1)  # type: ignore
+    with raises(ValueError):
+        router.complete("")
+    assert healthy.calls == 0 and router.backends[0].state == "closed"
+
+
+async def test_single_half_open_trial():
+    from time import monotonic
+
+    down, probe = AsyncFake("down", fail=True, delay=0.01), AsyncFake("probe", delay=0.01)
+    router = AsyncRouter([down, probe], strategy="least_outstanding", failure_threshold=5)  # type: ignore
+    router.backends[1].opened_at = monotonic() - router.cooldown  # half-open
+
+    first, second = await gather(router.complete(""), router.complete(""), return_exceptions=True)
+    assert isinstance(first, ConnectionError) and second == "probe"  # the first didn't follow up with a second trial
+    assert probe.calls == 1 and router.backends[1].state == "closed"
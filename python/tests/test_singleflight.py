@@ -0,0 +1,82 @@
+from asyncio import Event, Queue, create_task, gather, sleep
+
+from pytest import raises
+
+from promplate.llm.singleflight import CoalescedComplete, CoalescedGenerate
+
+
+async def test_coalesced_complete():
+    calls = 0
+
+    async def complete(prompt, **_):
+        nonlocal calls
+        calls += 1
+        await sleep(0.01)
+        return prompt
+
+    coalesced = CoalescedComplete(complete)
+    assert await gather(*(coalesced("same", temperature=0) for _ in range(10)), coalesced("other")) == ["same"] * 10 + ["other"]
+    assert calls == 2
+
+    await coalesced("same", temperature=0)
+    assert calls == 3  # nothing is kept once the request finished
+
+
+async def test_cancelling_one_caller():
+    release = Event()
+
+    async def complete(prompt, **_):
+        await release.wait()
+        return prompt
+
+    coalesced = CoalescedComplete(complete)
+    first, second = create_task(coalesced("a")), create_task(coalesced("a"))
+    await sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == "a"
+
+
+async def test_stream_fan_out():
+    calls = 0
+    upstream: Queue[str | None] = Queue()
+
+    async def generate(prompt, **_):
+        nonlocal calls
+        calls += 1
+        while (chunk := await upstream.get()) is not None:
+            yield chunk
+
+    coalesced = CoalescedGenerate(generate)
+
+    async def consume():
+        return [chunk async for chunk in coalesced("abc")]
+
+    early = create_task(consume())
+    upstream.put_nowait("a")
+    await sleep(0.01)
+    late = create_task(consume())  # joins mid-stream and replays what it missed
+    await sleep(0)
+    for chunk in ("b", "c", None):
+        upstream.put_nowait(chunk)
+
+    assert await gather(early, late) == [["a", "b", "c"]] * 2
+    assert calls == 1
+
+
+async def test_stream_errors_reach_every_subscriber():
+    async def generate(prompt, **_):
+        yield "a"
+        await sleep(0)
+        raise ValueError(prompt)
+
+    coalesced = CoalescedGenerate(generate)
+
+    async def consume():
+        return [chunk async for chunk in coalesced("x")]
+
+    results = await gather(consume(), consume(), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+    with raises(ValueError):
+        await consume()
@@ -1,7 +1,7 @@
 """Tests for the template syntax."""
 
 from collections import defaultdict
-from traceback import format_exc
+from traceback import format_exc, format_exception
 
 from pytest import raises
 
@@ -257,6 +257,18 @@ def test_bad_names():
         render_assert("Wat: {% for @ in x %}{% endfor %}")
 
 
+def test_syntax_errors_point_at_the_tag():
+    for text, position in [
+        ("ab\n  {{ var%&!@ }}", (2, 3)),  # raised when the generated code compiles
+        ("x\n{% if x %}\n{% for i in y %}{% endfor %}", (2, 1)),  # never closed
+        ("{{ 'a' }}\n{{\n    x = 1\n    x x\n}}", (2, 1)),  # a block parsed while compiling
+    ]:
+        with raises(SyntaxError) as info:
+            Template(text).render({})
+        assert (info.value.lineno, info.value.offset) == position
+        assert info.value.text == text.splitlines()[position[0] - 1]
+
+
 def test_bogus_tag_syntax():
     with raises(IndexError):
         render_assert("Huh: {% bogus %}!!{% endbogus %}??")
@@ -429,3 +441,268 @@ def test_error_handling_namesake():
         Template("{# raise TypeError(123) #}").render()
     except TypeError:
         assert "ValueError" not in format_exc()
+
+
+def test_shared_code_cache():
+    from promplate.prompt.cache import code_cache
+
+    code_cache.clear()
+    assert Template("{{ shared }}").render({"shared": 1}) == "1"
+    assert Template("{{ shared }}").render({"shared": 2}) == "2"
+    assert code_cache.info()[:2] == (1, 1)
+
+    code_cache.resize(0)
+    try:
+        assert Template("{{ uncached }}").render({"uncached": 3}) == "3"
+        assert len(code_cache) == 0
+    finally:
+        code_cache.resize(1024)
+
+
+def test_bytecode_cache(tmp_path):
+    from promplate.prompt.cache import BytecodeCache, code_cache
+
+    class CachedTemplate(Template):
+        bytecode_cache = BytecodeCache(tmp_path)
+
+    code_cache.clear()
+    assert CachedTemplate("{{ persisted }}").render({"persisted": 1}) == "1"
+    assert len(list(tmp_path.iterdir())) == 1
+
+    def fail(*_):
+        raise AssertionError("should be loaded from disk")
+
+    code_cache.clear()
+    CachedTemplate._compile_code = fail  # type: ignore
+    assert CachedTemplate("{{ persisted }}").render({"persisted": 2}) == "2"
+
+
+def test_render_iter():
+    t = Template("{% for i in range(n) %}<{{ i }}>{% endfor %}{% c %}")
+    context = {"n": 3, "c": Template("!")}
+    assert list(t.render_iter(context)) == ["<", "0", ">", "<", "1", ">", "<", "2", ">", "!"]
+    assert "".join(t.render_iter(context)) == t.render(context)
+    assert list(Template("").render_iter()) == []
+
+
+async def test_arender_iter():
+    async def f():
+        return 1
+
+    t = Template("a{{ await f() }}b")
+    assert [i async for i in t.arender_iter({"f": f})] == ["a", "1", "b"]
+
+
+def test_flat_context_write_back():
+    from promplate import ChainContext
+    from promplate.prompt.template import TemplateCore
+
+    context = ChainContext({}, {"n": 2})
+    template = TemplateCore("{# global total \ntotal = sum(range(n)) #}{{ total }}")
+    assert template.render(context) == "1"
+    assert context["total"] == 1
+
+    template.flat_context = False
+    assert Template("{% for i in range(n) %}{{ i }}{% endfor %}").render(context) == "01"
+
+
+def test_dependencies():
+    deps = Template(
+        "{% for i in items %}{{ i }}{{ [j for j in js] }}{% endfor %}"
+        "{# x = 1 \ndef f(): return y #}{% if x %}{{ f() }}{% endif %}{% c a=b %}"
+    ).dependencies
+    assert deps.reads == {"items", "js", "y", "c", "b"}
+    assert deps.writes == {"i", "x", "f"}
+    assert deps.components == {"c"}
+    assert deps.calls == set() and not deps.opaque_calls
+    assert Template("{{ g(x) }}{# import os #}").dependencies[-2:] == ({"g"}, True)
+
+
+async def test_render_cache():
+    from promplate.prompt.cache import RenderCache
+
+    template = Template("{{ a }}-{{ b }}", {"b": 2})
+    template.render_cache = cache = RenderCache(ttl=60)
+
+    assert template.render({"a": 1}) == template.render({"a": 1, "unused": object()}) == "1-2"
+    assert await template.arender({"a": 1}) == "1-2"
+    assert template.render({"a": 1.0}) == "1.0-2"  # equal values of different types are not conflated
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    template.render({"a": object()})  # unhashable by value, so rendered as usual
+    clock = Template("{{ time() }}")
+    clock.render_cache = cache
+    clock.render({"time": lambda: 0})
+    assert cache.bypasses == 2
+
+    cache.ttl = 0
+    template.render({"a": 3})
+    assert template.render({"a": 3}) == "3-2"
+    assert cache.evictions == 1
+
+
+def test_render_cache_bypasses_impure_renders():
+    from itertools import count
+
+    from promplate.prompt.cache import RenderCache
+
+    cache = RenderCache(pure=[str.upper])
+    template, writer = Template("{{ f(x) }}"), Template("{# global n \nn = x #}{{ n }}")
+    template.render_cache = writer.render_cache = cache
+
+    counter = count()
+    assert template.render({"f": lambda x: next(counter), "x": 0}) == "0"
+    assert template.render({"f": lambda x: next(counter), "x": 0}) == "1"  # callables may return anything each time
+    assert template.render({"f": str.upper, "x": "a"}) == template.render({"f": str.upper, "x": "a"}) == "A"
+    assert writer.render({"x": 1}) == writer.render({"x": 1}) == "1"
+    assert (cache.hits, cache.bypasses) == (1, 4)
+
+
+def test_render_cache_follows_what_the_template_calls():
+    from promplate.prompt.cache import RenderCache
+
+    cache = RenderCache(pure=[len])
+    for source in (
+        "{# from random import random as r #}{{ r() }}",
+        '{{ __import__("random").random() }}',
+        "{# import os #}{{ os.urandom(2) }}",
+        "{{ x.upper() }}",
+        "{# g = print #}{{ g(x) }}",
+    ):
+        template = Template(source)
+        template.render_cache = cache
+        assert template.render({"x": "a"}) is not None
+        assert template.render({"x": "a"}) is not None
+    assert (cache.hits, cache.bypasses) == (0, 10)
+
+    for source in ("{{ time }}-{{ id }}", "{{ len(x) }}", "{# def f(): return x #}{{ f() }}"):
+        template = Template(source)
+        template.render_cache = cache
+        template.render({"time": "noon", "id": "1", "x": "a"})
+        template.render({"time": "noon", "id": "1", "x": "a"})
+    assert (cache.hits, cache.bypasses) == (3, 10)
+
+
+def test_render_many():
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from pickle import dumps, loads
+
+    template = Template("{# global n \nn = i * k #}{{ n }}", {"k": 10})
+    contexts = [{"i": i} for i in range(5)] + [{"i": 1, "k": 2}]
+    expected = [template.render(c) for c in contexts]
+
+    assert template.render_many(contexts) == expected == ["0", "10", "20", "30", "40", "2"]
+    assert all("n" not in c for c in contexts) and "n" not in template.context
+
+    with ThreadPoolExecutor(2) as executor:
+        assert template.render_many(contexts, executor) == expected
+    with ProcessPoolExecutor(2) as executor:
+        assert template.render_many(contexts, executor, chunksize=3) == expected
+
+    copy = loads(dumps(template))
+    assert copy.name == "template" and copy.render_many(contexts) == expected
+
+
+async def test_arender_many():
+    template = Template("{{ await f(i) }}")
+
+    async def f(i):
+        return i * 2
+
+    assert await template.arender_many({"f": f, "i": i} for i in range(3)) == ["0", "2", "4"]
+    with raises(TypeError):
+        await template.arender_many([{"f": f, "i": None}])
+
+
+async def test_inline_components():
+    item = Template("{% for i in xs %}<{{ i }}{{ sep }}>{% endfor %}{# n = len(xs) #}[{{ n }}]")
+    wrap = Template("({% item xs=ys, sep=s %})", {"item": item})
+    text = "{% for i in range(2) %}{% wrap ys=[i, i + 1] %}{% endfor %}{{ i }}|{% item xs='ab' %}"
+    context = {"s": "!"}
+    expected = "(<0!><1!>[2])(<1!><2!>[2])1|<a-><b->[2]"
+
+    page = Template(text, {"wrap": wrap, "item": item, "sep": "-"})
+    page.inline_components = True
+    assert page.render(context) == await page.arender(context) == "".join(page.render_iter(context)) == expected
+    assert ".render(" not in page.get_script() and context == {"s": "!"}
+    assert page.dependencies.writes == {"i"} and not page.dependencies.components
+
+    dynamic = Template("{{ locals() }}")
+    with_defaults = Template("{{ x }}", {"x": 1})
+    page = Template("{% dynamic %}{% with_defaults %}", {"dynamic": dynamic, "with_defaults": with_defaults})
+    page.inline_components = True
+    assert page.get_script().count(".render(") == 2  # falls back to runtime calls
+
+    for defaults, values, expected in [({}, {"x": 2}, "2"), ({"x": 1}, {}, "1")]:  # only the first child is inlinable
+        page = Template("{% child %}", {"child": Template("{{ x }}", defaults)})
+        page.inline_components = True
+        assert page.render(values) == expected
+
+    item.text = "{{ xs }}"  # the inlined code is keyed on the components' text too
+    page = Template(text, {"wrap": wrap, "item": item, "sep": "-"})
+    page.inline_components = True
+    assert page.render(context) == "([0, 1])([1, 2])1|ab"
+
+
+def test_precompile(tmp_path, monkeypatch):
+    from sys import modules
+
+    from promplate.prompt.cache import code_cache
+    from promplate.prompt.precompile import load_precompiled, main
+
+    (tmp_path / "src" / "chat").mkdir(parents=True)
+    (tmp_path / "src" / "hello.j2").write_text("Hello {{ name }}!{% for i in range(n) %}{{ i }}{% endfor %}")
+    (tmp_path / "src" / "chat" / "1-system.j2").write_text("{# x = 1 #}{{ x }}")
+
+    main([str(tmp_path / "src"), str(tmp_path / "pkg" / "precompiled_prompts")])
+    monkeypatch.syspath_prepend(str(tmp_path / "pkg"))
+    try:
+        assert load_precompiled("precompiled_prompts") == 2
+        template = Template.read(tmp_path / "src" / "hello.j2")
+        code = modules["precompiled_prompts"].TEMPLATES["hello.j2"][1][0].__code__
+        assert code_cache.lookup((Template, template.text, True, False)) == code.replace(co_firstlineno=1)
+        assert template.render({"name": "world", "n": 2}) == "Hello world!01"
+        assert [i for i in Template.read(tmp_path / "src" / "chat" / "1-system.j2").render_iter()] == ["1"]
+    finally:
+        for name in [*modules]:
+            if name.startswith("precompiled_prompts"):
+                del modules[name]
+
+
+def test_error_handling_registers_once(monkeypatch, tmp_path):
+    import linecache
+    from sys import path
+
+    from promplate.prompt.tracebacks import SourceRegistry
+
+    monkeypatch.setattr("promplate.prompt.template.source_registry", registry := SourceRegistry(maxsize=2))
+    monkeypatch.syspath_prepend(tmp_path)  # so that `sys.path` gets restored in place, with what "file" mode appends
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    monkeypatch.setattr("atexit.register", lambda *args, **kwargs: deleted_at_exit.append(args[1]))
+    sys_path_length = len(path)
+    deleted_at_exit = []
+
+    template = Template("{{ a }}{{ b }}")
+    template.name = "registers_once"
+    calls = []
+    get_script = template.get_script
+    template.get_script = lambda *args: calls.append(args) or get_script(*args)  # type: ignore
+
+    for mode in ("linecache", "file", "tempfile", "tempfile"):
+        template.error_handling = mode  # type: ignore
+        with raises(NameError) as info:
+            template.render({"a": 1})
+        assert "__append__(b)" in "".join(format_exception(info.value))
+
+    assert len(calls) == 1 and len(path) == sys_path_length + 2
+    for directory in registry._directories.values():  # whichever mode comes first, only "tempfile" sources get deleted
+        assert (directory / "registers_once").read_text() == get_script(True, "\t")
+    assert deleted_at_exit == [registry._directories[True]]
+
+    for i in range(2):  # older sources get evicted from `linecache` too
+        with raises(NameError):
+            t = Template("{{ x%d }}" % i)
+            t.error_handling = "linecache"
+            t.name = f"evicting_{i}"
+            t.render()
+    assert len(registry) == 2 and "registers_once" not in linecache.cache
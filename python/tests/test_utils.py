@@ -25,3 +25,36 @@ async def test_accumulate():
 async def test_accumulate_empty():
     async for _ in accumulate_any(""):
         assert False
+
+
+def test_auto_naming_keeps_no_frame():
+    from gc import collect
+    from weakref import ref
+
+    from promplate import Node, Template
+
+    class Payload:
+        pass
+
+    def handler():
+        payload = Payload()
+        template = Template("{{ a }}")
+        node = Node(template)
+        return template, node, ref(payload)
+
+    kept = [handler() for _ in range(100)]
+    collect()
+    assert all(payload() is None for *_, payload in kept)
+    assert {(str(t), str(n)) for t, n, _ in kept} == {("<template>", "</node/>")}
+
+
+def test_auto_naming_opt_out():
+    from promplate import Template
+
+    class Anonymous(Template):
+        auto_naming = False
+
+    named = Template("")
+    anonymous = Anonymous("")
+    named = named if anonymous else Template("")  # conditional assignments still count
+    assert named.name == "named" and anonymous.name == "Anonymous"